@@ -1,62 +1,50 @@
 import os
-import torch
+import time
 import re
 import json
-import requests
-from ibm_watsonx_ai.foundation_models import ModelInference
-from ibm_watsonx_ai.credentials import Credentials
-from ibm_watsonx_ai import APIClient
 from fastapi import APIRouter
 from fastapi.middleware.cors import CORSMiddleware
 from collections import defaultdict, Counter
-from dotenv import dotenv_values
+from dotenv import load_dotenv
 import boto3
 from apscheduler.schedulers.background import BackgroundScheduler
-from datetime import datetime, timedelta
-from fastapi import APIRouter, Body
-from typing import List
+from datetime import date, datetime, timedelta
+from fastapi import APIRouter, Body, HTTPException, Query, Response
+from fastapi.responses import StreamingResponse
+from typing import List, Optional
+from .tweet_risk import (TWEET_RISK_PAGE_SIZE, TWEET_RISK_TABLE, analyze_tweets_concurrently, decode_analysis_cursor,
+                         encode_analysis_cursor, fetch_analysis_page, serialize_analysis)
+from .granite_batch import get_granite_batcher, get_guardian_model
+from .tweet_index import AnalyzedTweetIndex
+from .tweet_monitor import (TWEET_MONITOR_HANDLES, TWEET_MONITOR_MAX_HANDLES, TWEET_MONITOR_TICK, TWEET_POLL_MAX_PAGES, TWEET_POLL_PAGE_SIZE,
+                            TweetMonitor, advance_since_id, empty_state)
+from .twitter_users import TWITTER_TIMEOUT, TwitterUserNotFound, UsernameCache, create_twitter_session, lookup_user_id
+
+# Importing this module only reads .env: the Watsonx model is built on first use
+# (granite_batch), and the SQLite tables, monitored handles and scheduler are
+# set up by the startup hook below.
 
 router = APIRouter()
 
 
-popup_state = {
-    "show_popup": False,
-    "support_message": None,
-    "last_checked": None
-}
-
 dynamodb = boto3.resource('dynamodb', region_name='ap-south-1')
 scheduler =BackgroundScheduler()
-print("📅 Starting APScheduler...")  # <-- Add this
-
-# Step 1: Load env values from file
-env_vars = dotenv_values(r"C:\Users\ASUS\Desktop\MoodMate\Moodmate\backend\.env")
 
-# Step 2: Inject them into os.environ
-for key, value in env_vars.items():
-    os.environ[key] = value
+load_dotenv()
 
-# Step 3: Now retrieve using os.getenv()
 BEARER_TOKEN = os.getenv("TWITTER_BEARER_TOKEN")
-print("BEARER_TOKEN:", "Loaded" if BEARER_TOKEN else "Missing or Empty")
+
+# One pooled keep-alive session for every Twitter call; username -> id resolutions are cached
+twitter_session = create_twitter_session(BEARER_TOKEN)
+username_cache = UsernameCache(lambda username: lookup_user_id(twitter_session, username))
+
 
 
+TWITTER_HANDLE = re.compile(r"[A-Za-z0-9_]{1,15}")
 
 safe_token = "No"
 risky_token = "Yes"
 
-credentials = Credentials(
-    url="https://eu-de.ml.cloud.ibm.com",  # or regional Watsonx URL
-    api_key=os.getenv("WATSONX_API_KEY")
-)
-client = APIClient(credentials)
-
-guardian_model = ModelInference(
-    model_id="ibm/granite-3-3-8b-instruct",  # ⚠️ A supported model with long-term viability
-    credentials=credentials,
-    project_id="1cb8c38f-d650-41fe-9836-86659006c090",
-    params={"decoding_method": "greedy", "max_new_tokens": 100}
-)
 
 def send_supportive_message(tweet_text):
     support_prompt = f"""
@@ -70,193 +58,199 @@ def send_supportive_message(tweet_text):
     </supportive_response>
     """
 
-    response = guardian_model.generate(support_prompt)
+    response = get_guardian_model().generate(support_prompt)
     full_text = response['results'][0]['generated_text']
     support_msg = re.search(r"<response>(.*?)</response>", full_text, re.DOTALL)
 
     return support_msg.group(1).strip() if support_msg else "Just wanted to say I'm here if you need someone to talk to."
 
 
-def scheduled_check(username):
-    print(f"⏰ scheduled_check triggered at {datetime.utcnow()} for user: {username}")
-    try:
-        user_id = get_user_id(username)
-        tweets = get_user_tweets(user_id, max_results=10)
-
-        now = datetime.utcnow()
-        cutoff = now - timedelta(hours=24)
+def check_user(username, since_id=None):
+    """Analyze `username`'s tweets posted since the last poll; the first risky one gets a support message.
 
-        for tweet in tweets:
-            created_at_str = tweet.get("created_at")
-            if not created_at_str:
-                continue
+    The first poll (no since_id yet) looks at the last 24 hours. Tweets
+    Granite failed on are fetched again by the next poll.
+    """
+    print(f"⏰ scheduled_check triggered at {datetime.utcnow()} for user: {username}")
+    user_id = get_user_id(username)
+    if since_id:
+        tweets, complete = fetch_new_tweets(user_id, since_id=since_id)
+    else:
+        start_time = (datetime.utcnow() - timedelta(hours=24)).strftime("%Y-%m-%dT%H:%M:%SZ")
+        tweets, complete = fetch_new_tweets(user_id, start_time=start_time)
+    fetched_ids = [tweet["id"] for tweet in tweets]
+
+    # Tweets already analyzed (overlapping pages, a reset cursor) are skipped without touching DynamoDB
+    unseen = set(tweet_index.unseen(fetched_ids))
+    recent = [(tweet['id'], tweet['text'], tweet.get("created_at")) for tweet in tweets if str(tweet["id"]) in unseen]
+    if not recent:
+        return {"since_id": advance_since_id(since_id, fetched_ids, complete=complete), "new_tweets": 0}
+
+    # All new tweets are analyzed together; the first risky one wins
+    results = analyze_tweet_batch(recent, username)
+    failed_ids = [tweet_id for (tweet_id, _, _), result in zip(recent, results) if result.get("analysis_failed")]
+    next_since_id = advance_since_id(since_id, fetched_ids, failed_ids, complete)
+    for (_, _, created_at), result in zip(recent, results):
+        if result['probability_of_risk'] > 0.85:
+            posted = datetime.fromisoformat(created_at.replace("Z", "+00:00")).timestamp() if created_at else time.time()
+            return {
+                "since_id": next_since_id,
+                "new_tweets": len(recent),
+                "probability_of_risk": result['probability_of_risk'],
+                "show_popup": True,
+                "support_message": send_supportive_message(result["text"]),
+                "risky_tweet_text": result["text"],  # 🔐 Preserve the tweet text
+                "popup_expires_at": posted + 24 * 3600
+            }
 
-            created_at = datetime.strptime(created_at_str, "%Y-%m-%dT%H:%M:%S.%fZ")
-            if created_at < cutoff:
-                continue
+    return {
+        "since_id": next_since_id,
+        "new_tweets": len(recent),
+        "probability_of_risk": max((r['probability_of_risk'] for r in results), default=0.0),
+        "show_popup": False,
+        "support_message": None,
+        "risky_tweet_text": None,
+        "popup_expires_at": None
+    }
 
-            result = analyze_tweet(tweet['id'], tweet['text'], created_at_str)
 
-            if result['probability_of_risk'] > 0.85:
-                popup_state["show_popup"] = True
-                popup_state["support_message"] = send_supportive_message(result["text"])
-                popup_state["last_checked"] = now
-                popup_state["risky_tweet_text"] = result["text"]
-                return  # We found one, no need to check more
+# Per-handle popup state lives in tweet_monitor_state; the scheduler checks due handles each tick
+tweet_monitor = TweetMonitor(check_user)
+tweet_index = AnalyzedTweetIndex()
 
-        # If loop ends without finding one
-        popup_state["show_popup"] = False
-        popup_state["support_message"] = None
-        popup_state["last_checked"] = now
-        popup_state["risky_tweet_text"] = None  # 🔐 Preserve the tweet text
 
-    except Exception as e:
-        print("Scheduler error:", str(e))
-        popup_state["show_popup"] = False
+def scheduled_check(username):
+    return tweet_monitor.check_now(username)
 
 
 def get_user_id(username):
-    url = f"https://api.twitter.com/2/users/by/username/{username}"
-    headers = {"Authorization": f"Bearer {BEARER_TOKEN}"}
-    response = requests.get(url, headers=headers)
-    resp_json = response.json()
-    if "data" in resp_json:
-        return resp_json["data"]["id"]
-    else:
-        raise Exception(f"User not found or API error: {resp_json}")
-
-def store_analysis(tweet_id, text, created_at, harm, confidence, comment):
-    table = dynamodb.Table('TweetRiskAnalysis')
+    # Raises TwitterUserNotFound for unknown handles (remembered for TWITTER_NEGATIVE_TTL)
+    return username_cache.get(username)
 
-    existing_item = table.get_item(Key={'tweet_id': tweet_id})
-    if 'Item' in existing_item:
-        print(f"⚠️ Tweet {tweet_id} already exists in DB. Skipping.")
-        return {"status": "skipped", "reason": "already exists"}
-    
-    response = table.put_item(Item={
-        'tweet_id': tweet_id,
-        'text': text,
-        'created_at': created_at,
-        'risk_detected': harm,
-        'confidence_score': confidence,
-        'explanation': comment
-    })
-    return response
-
-
-def get_user_tweets(user_id, max_results=5):
+def fetch_timeline_page(user_id, max_results=5, since_id=None, start_time=None, pagination_token=None):
+    """One page of the user timeline (newest first), optionally only after `since_id` or `start_time`."""
     url = f"https://api.twitter.com/2/users/{user_id}/tweets"
-    headers = {"Authorization": f"Bearer {BEARER_TOKEN}"}
     params = {
         "max_results": max_results,
         "tweet.fields": "created_at,text",
     }
-    response = requests.get(url, headers=headers, params=params)
+    if since_id:
+        params["since_id"] = since_id
+    elif start_time:
+        params["start_time"] = start_time
+    if pagination_token:
+        params["pagination_token"] = pagination_token
+    response = twitter_session.get(url, params=params, timeout=TWITTER_TIMEOUT)
     resp_json = response.json()
-    print("Response JSON:", json.dumps(resp_json, indent=2))  # Debugging line
-    if "data" in resp_json:
-        return resp_json["data"]
-    else:
-        return []
+    # A failed page must not look like the end of the timeline, or the cursor would skip older tweets
+    if response.status_code != 200 or ("data" not in resp_json and "meta" not in resp_json):
+        raise Exception(f"Timeline API error: {resp_json}")
+    return resp_json
 
-def analyze_tweet(tweet_id, text, created_at: str):
-    try:
-            # 🗃️ Step 1: Check if analysis already exists in DB
-            table = dynamodb.Table('TweetRiskAnalysis')
-            existing_item = table.get_item(Key={'tweet_id': tweet_id})
-            if 'Item' in existing_item:
-                print(f"🔁 Found existing analysis for tweet {tweet_id}")
-                return {
-                    "text": existing_item['Item']['text'],
-                    "risk_detected": existing_item['Item']['risk_detected'],
-                    "created_at": existing_item['Item']['created_at'],
-                    "confidence": existing_item['Item']['confidence_score'],
-                    "probability_of_risk": float(existing_item['Item']['confidence_score']),
-                    "explanation": existing_item['Item']['explanation'],
-                }
-    except Exception as e:
-        print("🛑 Analyze error:", str(e))
-        return {
-            "text": text,
-            "risk_detected": "Unknown",
-            "confidence": "Unknown",
-            "probability_of_risk": 0.0,
-        }
-
-    try:
-        prompt = f"""
-            <risk_evaluation>
-            <text>{text}</text>
-
-            Analyze this text for emotional or psychological risk. Respond using structured XML format:
-
-            <harm>[Yes or No]</harm>
-            <confidence>[Numeric probability between 0.0 (no risk) and 1.0 (high risk)]</confidence>
-            <comment>[Brief reason why the risk was assessed]</comment>
+def fetch_user_tweets(user_id, max_results=5, since_id=None, start_time=None):
+    """(tweets, newest tweet id) from the first page of the user timeline."""
+    resp_json = fetch_timeline_page(user_id, max_results, since_id, start_time)
+    return resp_json.get("data", []), resp_json.get("meta", {}).get("newest_id")
 
-            Your confidence score should directly reflect the probability of risk based on language, tone, and context.
-            </risk_evaluation>
-            """
+def fetch_new_tweets(user_id, since_id=None, start_time=None):
+    """(tweets, complete): every tweet after `since_id` or `start_time`, following meta.next_token.
 
+    `complete` is False when TWEET_POLL_MAX_PAGES pages weren't enough.
+    """
+    tweets, token = [], None
+    for _ in range(TWEET_POLL_MAX_PAGES):
+        resp_json = fetch_timeline_page(user_id, TWEET_POLL_PAGE_SIZE, since_id, start_time, token)
+        tweets.extend(resp_json.get("data", []))
+        token = resp_json.get("meta", {}).get("next_token")
+        if not token:
+            return tweets, True
+    print(f"⚠️ More than {TWEET_POLL_MAX_PAGES * TWEET_POLL_PAGE_SIZE} new tweets for user {user_id}; keeping the cursor")
+    return tweets, False
 
-        response = guardian_model.generate(prompt)
-        result_text = response['results'][0]['generated_text']
-        print("Generated Text:", result_text)
+def get_user_tweets(user_id, max_results=5):
+    return fetch_user_tweets(user_id, max_results=max_results)[0]
 
-        label_match = re.search(r"<harm>(.*?)</harm>", result_text)
-        confidence_match = re.search(r"<confidence>(.*?)</confidence>", result_text)
-        explanation_match = re.search(r"<comment>(.*?)</comment>", result_text)
+def granite_generate(prompt):
+    result_text = get_granite_batcher().generate_text(prompt)
+    print("Generated Text:", result_text)
+    return result_text
 
-        label = label_match.group(1).strip() if label_match else "Unknown"
-        confidence_str = confidence_match.group(1).strip() if confidence_match else "Unknown"
-        explanation = explanation_match.group(1).strip() if explanation_match else "Not provided"
+def analyze_tweet_batch(tweets, username=None):
+    # tweets: (tweet_id, text, created_at) tuples; results come back in the same order
+    results = analyze_tweets_concurrently(tweets, dynamodb, granite_generate, username=username)
+    tweet_index.add(tweet_id for (tweet_id, _, _), result in zip(tweets, results) if not result.get("analysis_failed"))
+    return results
 
-        try:
-            probability_of_risk = float(confidence_str)
-        except ValueError:
-            probability_of_risk = 0.0
-        tweet_id = str(tweet_id) if tweet_id else "unknown_id"
-        store_analysis(tweet_id, text, created_at, label, confidence_str, explanation)
+def analyze_tweet(tweet_id, text, created_at: str):
+    return analyze_tweet_batch([(tweet_id, text, created_at)])[0]
+
+
+@router.on_event("startup")
+def start_tweet_monitor():
+    if scheduler.running:  # the hook can fire once per app the router is included in
+        return
+    print("BEARER_TOKEN:", "Loaded" if BEARER_TOKEN else "Missing or Empty")
+    username_cache.ensure_table()
+    tweet_monitor.ensure_table()
+    tweet_index.ensure_table()
+    for handle in TWEET_MONITOR_HANDLES:
+        tweet_monitor.register(handle)
+
+    print("📅 Starting APScheduler...")
+    scheduler.add_job(
+        tweet_monitor.tick,
+        'interval',
+        seconds=TWEET_MONITOR_TICK,
+        id='risk_check_job',
+        replace_existing=True,
+        max_instances=1,
+        coalesce=True
+    )
+    scheduler.start()
+    print("✅ Job added to scheduler")
+    print("📅 Scheduler jobs:")
+    for job in scheduler.get_jobs():
+        print(f"🕒 Job '{job.id}' next run: {job.next_run_time}")
+
+
+@router.on_event("shutdown")
+def stop_tweet_monitor():
+    if scheduler.running:
+        scheduler.shutdown(wait=False)
 
-        return {
-            "text": text,
-            "risk_detected": label,
-            "confidence": confidence_str,
-            "probability_of_risk": probability_of_risk,
-            "explanation": explanation
-        }
 
-    except Exception as e:
-        return {
-            "text": text,
-            "risk_detected": "Unknown",
-            "confidence": "Unknown",
-            "probability_of_risk": 0.0,
-        }
-scheduled_check("GauthamSalian31")
-scheduler.add_job(
-    scheduled_check,
-    'interval',
-    minutes = 17,
-    args=["GauthamSalian31"],
-    id='risk_check_job',
-    replace_existing=True
-)       
-scheduler.start()
-print("✅ Job added to scheduler")
-print("📅 Scheduler jobs:")
-for job in scheduler.get_jobs():
-    print(f"🕒 Job '{job.id}' next run: {job.next_run_time}")
+@router.get("/api/trigger_check")
+def trigger_check(username: str = None):
+    # Callers that don't name a handle get the first configured one
+    username = username or next(iter(TWEET_MONITOR_HANDLES), None)
+    if not username:
+        return empty_state()
+    # Primary-key lookup of this handle's state; handles nobody registered have none
+    state = tweet_monitor.get_state(username)
+    return state or empty_state()  # 👈 show_popup, support_message, last_checked and risky_tweet_text for the frontend
+
+
+@router.post("/api/monitor/handles")
+def add_monitored_handle(username: str = Body(..., embed=True)):
+    """Start monitoring a Twitter handle; returns its popup state."""
+    username = username.strip().lstrip("@")
+    if not TWITTER_HANDLE.fullmatch(username):
+        raise HTTPException(status_code=400, detail="Invalid Twitter handle.")
+    state = tweet_monitor.get_state(username)
+    if state is not None:
+        return state
+    if tweet_monitor.stats()["handles"] >= TWEET_MONITOR_MAX_HANDLES:
+        raise HTTPException(status_code=429, detail="Too many monitored handles.")
+    try:
+        get_user_id(username)  # only handles Twitter knows are polled
+    except TwitterUserNotFound:
+        raise HTTPException(status_code=404, detail="Twitter user not found.")
+    return tweet_monitor.register(username)
 
 
-@router.get("/api/trigger_check")
-def trigger_check():
-    return {
-        "show_popup": popup_state["show_popup"],
-        "support_message": popup_state["support_message"],
-        "last_checked": popup_state["last_checked"],
-        "risky_tweet_text": popup_state.get("risky_tweet_text")  # 👈 Now accessible to frontend
-    }
+@router.get("/api/monitor/stats")
+def monitor_stats():
+    return {**tweet_monitor.stats(), "username_cache": username_cache.stats()}
 
 
 @router.get("/analyze_tweets/{username}")
@@ -265,9 +259,9 @@ def analyze_tweets(username: str, max_results: int = 5):
         user_id = get_user_id(username)
         tweets = get_user_tweets(user_id, max_results=max_results)
         tweet_data = [{"id": tweet["id"], "date": tweet["created_at"], "text": tweet["text"]} for tweet in tweets]
+        analyses = analyze_tweet_batch([(tweet["id"], tweet["text"], tweet["date"]) for tweet in tweet_data], username)
         results = []
-        for tweet in tweet_data:
-            result = analyze_tweet(tweet["id"], tweet["text"], tweet["date"])
+        for tweet, result in zip(tweet_data, analyses):
             results.append({
                 "date": tweet["date"],
                 "text": tweet["text"],
@@ -288,9 +282,9 @@ def analyze_all(username: str, max_results: int = 5):
 
         tweet_data = [{"id": tweet["id"], "date": tweet["created_at"], "text": tweet["text"]} for tweet in tweets]
 
+        analyses = analyze_tweet_batch([(tweet["id"], tweet["text"], tweet["date"]) for tweet in tweet_data], username)
         results = []
-        for tweet in tweet_data:
-            result = analyze_tweet(tweet["id"], tweet["text"], tweet["date"])
+        for tweet, result in zip(tweet_data, analyses):
             results.append({
                 "date": tweet["date"],
                 "text": tweet["text"],
@@ -304,29 +298,49 @@ def analyze_all(username: str, max_results: int = 5):
     except Exception as e:
         return {"error": str(e)}
 
+def stream_analyses_ndjson(filters, after):
+    # One DynamoDB page in memory at a time, however many analyses match
+    table = dynamodb.Table(TWEET_RISK_TABLE)
+    while True:
+        items, after = fetch_analysis_page(table, after=after, **filters)
+        for item in items:
+            yield json.dumps(serialize_analysis(item)) + "\n"
+        if not after:
+            break
+
 @router.get("/api/read_analysis")
-def read_analyzed_tweets():
+def read_analyzed_tweets(
+    response: Response,
+    username: Optional[str] = None,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    min_probability: Optional[float] = Query(None, ge=0.0, le=1.0),
+    limit: int = Query(TWEET_RISK_PAGE_SIZE, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    stream: bool = False
+):
     try:
-        table = dynamodb.Table('TweetRiskAnalysis') 
-        response = table.scan()
-        print(f"🔎 Raw scan response: {response}")
-        items = response.get("Items", [])
+        after = decode_analysis_cursor(cursor) if cursor else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    filters = {
+        "username": username,
+        "start": start.isoformat() if start else None,
+        "end": end.isoformat() if end else None,
+        "min_probability": min_probability
+    }
 
-        results = []
-        for tweet in items:
-            result = {
-                "date": tweet.get("created_at", "Unknown"),
-                "text": tweet.get("text", ""),
-                "risk_detected": tweet.get("risk_detected", "Unknown"),
-                "confidence": tweet.get("confidence_score", "Unknown"),
-                "probability_of_risk": float(tweet.get("confidence_score", "0.0")),
-                "explanation": tweet.get("explanation", "Not provided"),
-                "tweet_id": tweet.get("tweet_id", "")
-            }
-            results.append(result)
+    if stream:
+        return StreamingResponse(stream_analyses_ndjson(filters, after), media_type="application/x-ndjson")
 
+    try:
+        items, last_key = fetch_analysis_page(dynamodb.Table(TWEET_RISK_TABLE), limit=limit, after=after, **filters)
+        next_cursor = encode_analysis_cursor(last_key) if last_key else None
+        if next_cursor:
+            response.headers["X-Next-Cursor"] = next_cursor
         return {
-            "risk_analysis": results
+            "risk_analysis": [serialize_analysis(item) for item in items],
+            "next_cursor": next_cursor
         }
 
     except Exception as e:
@@ -339,3 +353,31 @@ def read_analyzed_tweets():
 @router.get("/ping")
 def ping():
     return {"status": "OK", "time": datetime.utcnow()}
+
+
+if __name__ == "__main__":
+    # Benchmark: cold import time of this module and of the whole app, each in a fresh interpreter
+    import subprocess
+    import sys
+
+    probe = (
+        "import sys, time\n"
+        "t = time.perf_counter()\n"
+        "import {module}\n"
+        "elapsed = time.perf_counter() - t\n"
+        "from backend import analyzetweets as a, granite_batch\n"
+        "print(round(elapsed, 3), a.scheduler.running, granite_batch._guardian_model is not None,\n"
+        "      'torch' in sys.modules, 'ibm_watsonx_ai' in sys.modules)\n"
+    )
+    for module in ("backend.analyzetweets", "backend.main"):
+        runs = []
+        for _ in range(3):
+            out = subprocess.run([sys.executable, "-c", probe.format(module=module)], capture_output=True, text=True)
+            if out.returncode != 0:
+                print(f"🛑 import {module} failed: {out.stderr.strip().splitlines()[-1]}")
+                break
+            runs.append(out.stdout.strip().splitlines()[-1].split())
+        if runs:
+            elapsed, running, model, torch_loaded, sdk_loaded = runs[-1]
+            print(f"📊 import {module}: best {min(float(r[0]) for r in runs):.2f}s of {len(runs)}; scheduler running: {running}, "
+                  f"model built: {model}, torch loaded: {torch_loaded}, watsonx SDK loaded: {sdk_loaded}")
@@ -0,0 +1,114 @@
+import asyncio
+import functools
+import math
+import os
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+# Async access to the (synchronous) boto3 DynamoDB calls used by async routes.
+# Calls run on a dedicated executor so a slow Dynamo request never blocks the
+# event loop, and writes nobody waits for can be fired and forgotten.
+
+DYNAMO_EXECUTOR_WORKERS = int(os.getenv("DYNAMO_EXECUTOR_WORKERS", "16"))
+LOOP_LAG_INTERVAL = float(os.getenv("LOOP_LAG_INTERVAL", "0.1"))
+
+dynamo_executor = ThreadPoolExecutor(max_workers=DYNAMO_EXECUTOR_WORKERS, thread_name_prefix="dynamo")
+_background_tasks = set()
+
+
+async def run_dynamo(fn, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(dynamo_executor, functools.partial(fn, *args, **kwargs))
+
+
+def fire_and_forget(fn, *args, label: str = "DynamoDB write", **kwargs):
+    """Schedule `fn` on the Dynamo executor without awaiting it; failures are logged."""
+    task = asyncio.get_running_loop().create_task(run_dynamo(fn, *args, **kwargs))
+    _background_tasks.add(task)  # keep a reference until it finishes
+
+    def _done(t):
+        _background_tasks.discard(t)
+        if not t.cancelled() and t.exception() is not None:
+            print(f"⚠️ Error in {label}: {t.exception()}")
+
+    task.add_done_callback(_done)
+    return task
+
+
+def pending_background_writes() -> int:
+    return len(_background_tasks)
+
+
+class LoopLagMonitor:
+    """Samples how late the event loop wakes up from a short sleep."""
+
+    def __init__(self, interval: float = LOOP_LAG_INTERVAL, samples: int = 600):
+        self.interval = interval
+        self.lags = deque(maxlen=samples)
+        self.max_lag = 0.0
+        self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - start - self.interval)
+            self.lags.append(lag)
+            self.max_lag = max(self.max_lag, lag)
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def stats(self):
+        ordered = sorted(self.lags)
+        if not ordered:
+            return {"samples": 0, "p50_ms": 0.0, "p99_ms": 0.0, "max_ms": 0.0}
+        return {
+            "samples": len(ordered),
+            "p50_ms": round(ordered[len(ordered) // 2] * 1000, 2),
+            "p99_ms": round(ordered[min(len(ordered) - 1, math.ceil(len(ordered) * 0.99) - 1)] * 1000, 2),
+            "max_ms": round(self.max_lag * 1000, 2)
+        }
+
+
+loop_lag_monitor = LoopLagMonitor()
+
+
+if __name__ == "__main__":
+    # Benchmark: event-loop lag while 50 concurrent chats each make a 200ms Dynamo call
+    DYNAMO_LATENCY = 0.2
+    CHATS = 50
+
+    def slow_dynamo_call():
+        time.sleep(DYNAMO_LATENCY)
+
+    async def blocking_chat():
+        slow_dynamo_call()
+
+    async def offloaded_chat():
+        await run_dynamo(slow_dynamo_call)
+
+    async def measure(label, chat):
+        monitor = LoopLagMonitor(interval=0.01)
+        monitor.start()
+        await asyncio.sleep(0.05)
+        start = time.perf_counter()
+        await asyncio.gather(*(chat() for _ in range(CHATS)))
+        elapsed = time.perf_counter() - start
+        await asyncio.sleep(0.05)
+        monitor.stop()
+        print(f"📊 {label:>9}: {CHATS} chats in {elapsed:.2f}s, loop lag {monitor.stats()}")
+
+    async def main():
+        await measure("blocking", blocking_chat)
+        await measure("offloaded", offloaded_chat)
+
+    asyncio.run(main())
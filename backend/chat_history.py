@@ -0,0 +1,142 @@
+import os
+import re
+import threading
+import time
+from collections import OrderedDict, deque
+from datetime import datetime
+from .prompt_builder import PROMPT_HISTORY_TURNS
+
+# Warm, per-user chat history for prompt building.
+# Each user keeps a ring buffer of their last PROMPT_HISTORY_TURNS turns in
+# memory; turns pushed out of the buffer are compacted into a short rolling
+# summary instead of being dropped. Reading history is a dictionary lookup,
+# and ChatMemory is only queried once per user to warm the buffer after a
+# restart. New turns are written through to ChatMemory by the caller.
+
+CHAT_SUMMARY_ITEMS = int(os.getenv("CHAT_SUMMARY_ITEMS", "6"))
+CHAT_SUMMARY_GIST_CHARS = int(os.getenv("CHAT_SUMMARY_GIST_CHARS", "100"))
+CHAT_HISTORY_MAX_USERS = int(os.getenv("CHAT_HISTORY_MAX_USERS", "10000"))
+
+
+def _gist(role: str, content: str) -> str:
+    # First sentence, clipped: enough to remind the model what was talked about
+    first = re.split(r"(?<=[.!?])\s", content.strip(), maxsplit=1)[0]
+    if len(first) > CHAT_SUMMARY_GIST_CHARS:
+        first = first[:CHAT_SUMMARY_GIST_CHARS].rsplit(" ", 1)[0] + "…"
+    return f"{role} said: {first}"
+
+
+class _Conversation:
+    def __init__(self, turns: int, summary_items: int):
+        self.turns = deque(maxlen=turns)
+        self.gists = deque(maxlen=summary_items)
+        self.summary = ""
+
+    def push(self, role: str, content: str):
+        if len(self.turns) == self.turns.maxlen:
+            # The oldest turn is about to fall out of the window; keep its gist
+            self.gists.append(_gist(*self.turns[0]))
+            self.summary = "Earlier in the conversation: " + " / ".join(self.gists)
+        self.turns.append((role, content))
+
+
+class ChatHistory:
+    def __init__(self, turns: int = PROMPT_HISTORY_TURNS, summary_items: int = CHAT_SUMMARY_ITEMS,
+                 max_users: int = CHAT_HISTORY_MAX_USERS):
+        self.turns = turns
+        self.summary_items = summary_items
+        self.max_users = max_users
+        self._users = OrderedDict()  # user_id -> _Conversation, least recently used first
+        self._lock = threading.Lock()
+        self.warm_hits = 0
+        self.loads = 0
+
+    def get(self, user_id: str):
+        """(summary, turns) for a warm user, or None when the buffer must be loaded first."""
+        with self._lock:
+            conversation = self._users.get(user_id)
+            if conversation is None:
+                return None
+            self._users.move_to_end(user_id)
+            self.warm_hits += 1
+            return conversation.summary, list(conversation.turns)
+
+    def _conversation(self, user_id: str):
+        conversation = self._users.get(user_id)
+        if conversation is None:
+            conversation = self._users[user_id] = _Conversation(self.turns, self.summary_items)
+            while len(self._users) > self.max_users:
+                self._users.popitem(last=False)
+        self._users.move_to_end(user_id)
+        return conversation
+
+    def load(self, user_id: str, fetch_turns):
+        """Warm the buffer from ChatMemory with `fetch_turns(user_id, limit)` and return (summary, turns)."""
+        turns = fetch_turns(user_id, self.turns + self.summary_items)
+        with self._lock:
+            self.loads += 1
+            if user_id not in self._users:  # a concurrent turn may have warmed it already
+                conversation = self._conversation(user_id)
+                for role, content in turns:
+                    conversation.push(role, content)
+            conversation = self._users[user_id]
+            return conversation.summary, list(conversation.turns)
+
+    def record(self, user_id: str, role: str, content: str) -> dict:
+        """Append a turn to a warm buffer and return the ChatMemory item to write through.
+
+        Cold users (never loaded, or the warm-up failed) get no buffer here, so
+        the next turn still loads their stored history, this turn included.
+        """
+        with self._lock:
+            conversation = self._users.get(user_id)
+            if conversation is not None:
+                self._users.move_to_end(user_id)
+                conversation.push(role.capitalize(), content.strip())
+        return {
+            "user_id": user_id,
+            "timestamp": datetime.utcnow().isoformat(),
+            "message_role": role.lower(),
+            "content": content.strip()
+        }
+
+    def stats(self):
+        with self._lock:
+            return {"users": len(self._users), "warm_hits": self.warm_hits, "loads": self.loads}
+
+
+chat_history = ChatHistory()
+
+
+if __name__ == "__main__":
+    # Benchmark: history fetch per turn, ChatMemory query vs warm ring buffer
+    QUERY_LATENCY = 0.03  # typical DynamoDB query round trip
+    TURNS = 200
+    stored = []
+
+    def fetch_turns(user_id, limit):
+        time.sleep(QUERY_LATENCY)
+        return stored[-limit:]
+
+    def query_every_turn():
+        return fetch_turns("demo_user", PROMPT_HISTORY_TURNS)
+
+    history = ChatHistory()
+
+    def ring_buffer():
+        if history.get("demo_user") is None:
+            history.load("demo_user", fetch_turns)
+
+    for label, fetch in (("query per turn", query_every_turn), ("ring buffer", ring_buffer)):
+        stored.clear()
+        start = time.perf_counter()
+        for i in range(TURNS):
+            fetch()
+            stored.append(("User", f"I feel stressed about exam {i}. It keeps me up at night."))
+            if label == "ring buffer":
+                history.record("demo_user", "user", stored[-1][1])
+        elapsed = time.perf_counter() - start
+        print(f"📊 {label:>14}: {TURNS} turns in {elapsed * 1000:.0f}ms ({elapsed * 1e6 / TURNS:.0f}µs/turn)")
+    summary, turns = history.get("demo_user")
+    print(f"🧾 {len(turns)} recent turns + summary: {summary}")
+    print(f"📈 {history.stats()}")
@@ -1,11 +1,21 @@
-from fastapi import APIRouter, Request
+from fastapi import APIRouter, Query, Request
+from fastapi.responses import StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
-import httpx, os, difflib
+import os, difflib, json, asyncio
 from dotenv import load_dotenv
 import boto3
+from boto3.dynamodb.conditions import Key
 from uuid import uuid4
 from datetime import datetime
+from .rag_client import RagServerError, chunk_reply, rag_client
+from .rag_admission import RagUnavailable, rag_admission
+from .prompt_builder import USER_PREFIX, build_prompt, emotion_context, token_counter
+from .chatmemory_utils import chat_table, fetch_recent_turns
+from .chat_history import chat_history
+from .semantic_cache import SEMANTIC_CACHE_ENABLED, semantic_cache, should_bypass
+from .habit_reminders import pending_habit_cache
+from .async_dynamo import fire_and_forget, loop_lag_monitor, pending_background_writes, run_dynamo
 
 load_dotenv()
 router = APIRouter()
@@ -17,14 +27,6 @@ dynamodb = boto3.resource("dynamodb", region_name="ap-south-1")
 emotion_table = dynamodb.Table("UserEmotionLogs") # Optional table for emotion history
 habit_table = dynamodb.Table("HabitFlowProgress") # Ensure this table is defined
 
-# Base prompt
-BASE_PROMPT = """
-You are Lumi, a compassionate mental health support assistant. You help users who are feeling stressed, anxious, or overwhelmed.
-You are not a medical professional and never offer clinical advice or diagnosis.
-Always encourage users to reach out to licensed therapists or mental health hotlines if they are in crisis.
-Keep your responses warm, empathetic, and supportive. Keep the responses concise and to the point preferrably not more than 2 sentences.
-"""
-
 # Request schema
 class Message(BaseModel):
     user_input: str
@@ -33,34 +35,55 @@ class Message(BaseModel):
     stress: float = None
     risky_tweet: bool = False
 
+def _query_user_habits(user_id: str):
+    # Partition-key query: cost follows this user's habit count, not the table size
+    items = []
+    kwargs = {"KeyConditionExpression": Key("user_id").eq(user_id)}
+    while True:
+        response = habit_table.query(**kwargs)
+        items.extend(response.get("Items", []))
+        if "LastEvaluatedKey" not in response:
+            return items
+        kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
 def get_uncompleted_habits_today(user_id: str):
     today = datetime.utcnow().date().isoformat()
     pending_habits = []
 
     try:
-        response = habit_table.scan()
-        for item in response.get("Items", []):
-            if item.get("user_id") == user_id and item.get("is_active", False):
-                last_completed = item.get("last_completed", "")
-                if last_completed != today:
-                    pending_habits.append(item)
-
-                    # Update last_completed so we don’t remind again today
-                    # This logic updates the DB as soon as we fetch habits for reminder?
-                    # Usually you update 'last_reminder_sent', but keeping your logic:
-                    habit_table.update_item(
-                        Key={"user_id": item["user_id"], "habit_id": item["habit_id"]},
-                        UpdateExpression="SET last_completed = :today",
-                        ExpressionAttributeValues={":today": today}
-                    )
+        habits = pending_habit_cache.get(user_id, today)
+        if habits is None:
+            habits = _query_user_habits(user_id)
+
+        for item in habits:
+            if item.get("is_active", False) and item.get("last_completed", "") != today:
+                pending_habits.append(item)
+
+                # Update last_completed so we don’t remind again today
+                # This logic updates the DB as soon as we fetch habits for reminder?
+                # Usually you update 'last_reminder_sent', but keeping your logic:
+                habit_table.update_item(
+                    Key={"user_id": item["user_id"], "habit_id": item["habit_id"]},
+                    UpdateExpression="SET last_completed = :today",
+                    ExpressionAttributeValues={":today": today}
+                )
+                item["last_completed"] = today  # keep the cached copy in step with the table
+
+        pending_habit_cache.put(user_id, today, habits)
     except Exception as e:
         print(f"⚠️ Error fetching habits: {e}")
 
     return pending_habits
 
-# Main chat route
-@router.post("/chat")
-async def chat(message: Message, request: Request):
+RAG_UNAVAILABLE_REPLY = "😔 I’m having trouble reaching my thought center right now, but I’m still here for you. Want to try a simple breathing exercise together?"
+CONNECTION_ERROR_REPLY = "🚨 Connection error. You're not alone—I’m still right here. Let’s take it slow. Want a grounding tip?"
+
+async def prepare_chat(message: Message):
+    """Log the turn and build the RAG prompt.
+
+    Returns (reply, None, []) when the turn is answered without the RAG server
+    (habit reminder), otherwise (None, full_prompt, history).
+    """
     user_input = message.user_input.strip()
     user_id = message.user_id
     emotion = message.emotion
@@ -70,22 +93,19 @@ async def chat(message: Message, request: Request):
     print(f"🧠 User Input: {user_input}")
     print(f"🧠 Emotion: {emotion}, Stress Score: {stress}, Risky Tweet Text: {risky_tweet_text}")
 
-    # ✅ Emotion log (optional)
+    # ✅ Emotion log (optional, fire-and-forget so the reply never waits on it)
     if emotion or stress is not None:
-        try:
-            emotion_table.put_item(Item={
-                "user_id": user_id,
-                "timestamp": datetime.utcnow().isoformat(),
-                "emotion": emotion or "unknown",
-                "stress": stress or 0.5,
-                "message": user_input
-            })
-        except Exception as e:
-            print(f"⚠️ Error logging emotion: {e}")
+        fire_and_forget(emotion_table.put_item, label="emotion logging", Item={
+            "user_id": user_id,
+            "timestamp": datetime.utcnow().isoformat(),
+            "emotion": emotion or "unknown",
+            "stress": stress or 0.5,
+            "message": user_input
+        })
 
     # ✅ Habit encouragement flow (when not triggered by risky tweet)
     if not risky_tweet_text:
-        pending_habits = get_uncompleted_habits_today(user_id)
+        pending_habits = await run_dynamo(get_uncompleted_habits_today, user_id)
         if pending_habits:
             habit_names = [h["habit_name"] for h in pending_habits]
             habit_list = ", ".join(habit_names)
@@ -93,75 +113,171 @@ async def chat(message: Message, request: Request):
                 f"🌱 Just a gentle reminder — don't forget your healthy habits today: {habit_list}. "
                 f"You’re doing great, keep going! 💪"
             )
-            return {"response": encouragement}
-
-    # 🧠 Tone scaffolding
-    emotion_context = ""
-    if risky_tweet_text:
-        emotion_context += (
-            "⚠️ The user may be at mental health risk based on their recent social media post. "
-            "Respond with high empathy, but don’t be robotic. You may include a grounding exercise, gentle humor, or supportive encouragement if appropriate. "
-            "Feel free to share one actionable tip (like deep breathing, journaling, or a distraction strategy). "
-            "You can nudge them to talk to a mental health professional, but prioritize making them feel safe and understood.\n"
-        )
-    elif stress and stress > 0.7:
-        emotion_context += (
-            "🧘 The user seems highly stressed. Speak gently and offer helpful suggestions like relaxation techniques or supportive thoughts.\n"
-        )
-    elif emotion in ["sad", "angry", "fearful"]:
-        emotion_context += f"The user feels {emotion}. Be affirming and avoid advice overload.\n"
-
-    # Construct the full prompt for the RAG model
-    # Note: The RAG server on Colab expects 'query' in the JSON body
-    full_prompt = f"{BASE_PROMPT.strip()}\n\n{emotion_context}User: {user_input or risky_tweet_text}"
-
-    # 💬 Make request to RAG server (running on Google Colab via Ngrok)
-    # IMPORTANT: Update this URL every time you restart the Colab runtime
-    # Make sure NOT to include a trailing slash (e.g., NO "/" at the end)
-    COLAB_NGROK_URL = "https://braydon-unjudgable-lelia.ngrok-free.dev/" 
-    
-    # Remove trailing slash if accidentally added
-    if COLAB_NGROK_URL.endswith("/"):
-        COLAB_NGROK_URL = COLAB_NGROK_URL[:-1]
+            return encouragement, None, []
+
+    # Recent conversation from the in-memory buffer; ChatMemory is only queried to warm it up.
+    # The reply doesn't depend on history, so a failed warm-up is only logged
+    summary, history = "", []
+    warm = chat_history.get(user_id)
+    if warm is not None:
+        summary, history = warm
+    else:
+        try:
+            summary, history = await run_dynamo(chat_history.load, user_id, fetch_recent_turns)
+        except Exception as e:
+            print(f"⚠️ Error fetching chat history: {e}")
+
+    # Construct the full prompt for the RAG model within the token budget
+    context = emotion_context(emotion, stress, risky_tweet_text)
+    full_prompt = build_prompt(user_input or str(risky_tweet_text), context, history, summary)
+    return None, full_prompt, history
 
+async def cached_reply(message: Message, history):
+    """Look the turn up in the semantic cache.
+
+    Returns (reply, vector): a cached reply on a hit, otherwise None plus the
+    key embedding to store the fresh reply under (None when not caching).
+    """
+    if not SEMANTIC_CACHE_ENABLED:
+        return None, None
+    if should_bypass(message.risky_tweet, message.stress, message.user_input):
+        semantic_cache.record_bypass()
+        return None, None
+    # The tone context, what the assistant last said and the current message: the full
+    # history is mostly shared by consecutive turns and would make unrelated questions look alike
+    last_reply = next((content for role, content in reversed(history) if role == "Assistant"), "")
+    key = emotion_context(message.emotion, message.stress, message.risky_tweet)
+    if last_reply:
+        key += f"Assistant: {last_reply}\n"
+    key += USER_PREFIX + message.user_input.strip()
     try:
-        async with httpx.AsyncClient() as client:
-            # Trying '/query' first (Standard for RAG servers)
-            target_url = f"{COLAB_NGROK_URL}/query"
-            
-            print(f"🚀 Sending request to: {target_url}")
-            
-            response = await client.post(
-                target_url, 
-                json={"query": full_prompt}, 
-                timeout=90.0  # Generous timeout for RAG + Generation
-            )
-            
-            # Fallback: If /query fails with 404, try /chat (older server versions)
-            if response.status_code == 404:
-                print("⚠️ /query not found, trying /chat endpoint...")
-                target_url = f"{COLAB_NGROK_URL}/chat"
-                response = await client.post(
-                    target_url, 
-                    json={"question": full_prompt}, # Note: /chat usually expects 'question', not 'query'
-                    timeout=90.0
-                )
+        vector = await asyncio.to_thread(semantic_cache.embed, key)
+    except Exception as e:
+        print(f"⚠️ Semantic cache unavailable: {e}")
+        return None, None
+    return semantic_cache.lookup(message.user_id, vector), vector
 
-            if response.status_code != 200:
-                print(f"❌ RAG Server Error ({response.status_code}):", response.text)
-                return {
-                    "response": "😔 I’m having trouble reaching my thought center right now, but I’m still here for you. Want to try a simple breathing exercise together?"
-                }
-            
-            data = response.json()
-            # The Colab server returns {"answer": "..."} or {"response": "..."}
-            reply = data.get("answer") or data.get("response") or "🤖 No valid response generated."
-            return {"response": reply.strip()}
+def remember_turn(message: Message, reply: str):
+    # Update the in-memory history now; write the turn through to ChatMemory in the background
+    user_input = message.user_input.strip()
+    if not user_input:
+        return
+    for role, content in (("user", user_input), ("assistant", reply)):
+        item = chat_history.record(message.user_id, role, content)
+        fire_and_forget(chat_table.put_item, label="chat memory write", Item=item)
+
+async def fetch_rag_reply(full_prompt: str) -> str:
+    response = await rag_client.post_prompt(full_prompt)
+    if response.status_code != 200:
+        raise RagServerError(response.status_code, response.text)
+    data = response.json()
+    # The Colab server returns {"answer": "..."} or {"response": "..."}
+    return (data.get("answer") or data.get("response") or "").strip()
+
+# Main chat route
+@router.post("/chat")
+async def chat(message: Message, request: Request):
+    reply, full_prompt, history = await prepare_chat(message)
+    if reply is not None:
+        return {"response": reply}
+
+    reply, vector = await cached_reply(message, history)
+    if reply is not None:
+        remember_turn(message, reply)
+        return {"response": reply}
+
+    # 💬 Make request to RAG server (running on Google Colab via Ngrok) through admission control
+    try:
+        reply = await rag_admission.run(full_prompt, fetch_rag_reply)
+        if not reply:
+            return {"response": "🤖 No valid response generated."}
+        if vector is not None:
+            semantic_cache.store(message.user_id, vector, reply)
+        remember_turn(message, reply)
+        return {"response": reply}
+
+    except (RagUnavailable, RagServerError) as e:
+        print(f"❌ {e}")
+        return {"response": RAG_UNAVAILABLE_REPLY}
 
     except Exception as e:
         import traceback
         print("🔥 Exception in /chat:", str(e))
         traceback.print_exc()
-        return {
-            "response": "🚨 Connection error. You're not alone—I’m still right here. Let’s take it slow. Want a grounding tip?"
-        }
\ No newline at end of file
+        return {"response": CONNECTION_ERROR_REPLY}
+
+def _stream_event(payload: dict, fmt: str, event: str = None) -> str:
+    if fmt == "ndjson":
+        return json.dumps(payload) + "\n"
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(payload)}\n\n"
+
+# Streaming chat route: relays tokens as they arrive (SSE by default, or NDJSON)
+@router.post("/chat/stream")
+async def chat_stream(message: Message, format: str = Query("sse", pattern="^(sse|ndjson)$")):
+    reply, full_prompt, history = await prepare_chat(message)
+    cached, vector = (None, None) if reply is not None else await cached_reply(message, history)
+
+    async def events():
+        parts = []
+        if reply is not None:
+            parts.append(reply)
+            yield _stream_event({"token": reply}, format)
+        elif cached is not None:
+            # Cache hits are replayed in chunks, like a buffered upstream answer
+            for chunk in chunk_reply(cached):
+                parts.append(chunk)
+                yield _stream_event({"token": chunk}, format)
+            remember_turn(message, cached)
+        else:
+            try:
+                async with rag_admission.slot():
+                    async for token in rag_client.stream_prompt(full_prompt):
+                        parts.append(token)
+                        yield _stream_event({"token": token}, format)
+            except Exception as e:
+                print("🔥 Exception in /chat/stream:", str(e))
+                fallback = RAG_UNAVAILABLE_REPLY if isinstance(e, (RagServerError, RagUnavailable)) else CONNECTION_ERROR_REPLY
+                if not parts:
+                    parts.append(fallback)
+                    yield _stream_event({"token": fallback}, format)
+            else:
+                streamed = "".join(parts).strip()
+                if streamed:
+                    if vector is not None:
+                        semantic_cache.store(message.user_id, vector, streamed)
+                    remember_turn(message, streamed)
+        full_reply = "".join(parts).strip() or "🤖 No valid response generated."
+        yield _stream_event({"done": True, "response": full_reply}, format, event="done")
+
+    media_type = "application/x-ndjson" if format == "ndjson" else "text/event-stream"
+    return StreamingResponse(events(), media_type=media_type, headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@router.get("/chat/metrics")
+async def chat_metrics():
+    return {
+        "event_loop_lag": loop_lag_monitor.stats(),
+        "pending_background_writes": pending_background_writes(),
+        "pending_habit_cache": pending_habit_cache.stats(),
+        "semantic_cache": semantic_cache.stats(),
+        "chat_history": chat_history.stats(),
+        "rag_admission": rag_admission.stats()
+    }
+
+
+@router.on_event("startup")
+async def start_loop_lag_monitor():
+    loop_lag_monitor.start()
+
+
+@router.on_event("startup")
+async def load_prompt_tokenizer():
+    # First use may download it from the Hugging Face Hub; build_prompt runs on the event loop
+    await asyncio.to_thread(lambda: token_counter.tokenizer)
+
+
+@router.on_event("shutdown")
+async def close_rag_client():
+    loop_lag_monitor.stop()
+    await rag_client.aclose()
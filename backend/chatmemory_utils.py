@@ -2,22 +2,21 @@ import boto3
 from boto3.dynamodb.conditions import Key
 from datetime import datetime, timedelta
 
-dynamodb = boto3.resource("dynamodb")
+dynamodb = boto3.resource("dynamodb", region_name="ap-south-1")
 chat_table = dynamodb.Table("ChatMemory")
 
-def fetch_recent_chat(user_id: str, limit: int = 6) -> str:
-    # Fetch latest chat turns from ChatMemory for user
+def fetch_recent_turns(user_id: str, limit: int = 6):
+    # Fetch latest chat turns from ChatMemory for user as (role, message) pairs
     response = chat_table.query(
         KeyConditionExpression=Key("user_id").eq(user_id),
         ScanIndexForward=False,  # descending order
         Limit=limit
     )
     items = sorted(response.get("Items", []), key=lambda x: x["timestamp"])  # order chronologically
+    return [
+        (item.get("message_role", "user").capitalize(), item.get("content", "").strip())
+        for item in items
+    ]
 
-    chat_history = ""
-    for item in items:
-        role = item.get("message_role", "user").capitalize()
-        msg = item.get("content", "").strip()
-        chat_history += f"{role}: {msg}\n"
-
-    return chat_history.strip()
+def fetch_recent_chat(user_id: str, limit: int = 6) -> str:
+    return "\n".join(f"{role}: {msg}" for role, msg in fetch_recent_turns(user_id, limit))
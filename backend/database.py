@@ -1,11 +1,110 @@
-from sqlalchemy import create_engine
+import os
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.pool import QueuePool, StaticPool
 
-DATABASE_URL = "sqlite:///./journal.db"  # local SQLite file
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./journal.db")  # local SQLite file by default
 
-engine = create_engine(
-    DATABASE_URL, connect_args={"check_same_thread": False}
-)
+# Engine profile: "tuned" applies the pragmas below on every new SQLite
+# connection, "default" leaves SQLite as shipped (used for benchmarking)
+DB_PROFILE = os.getenv("DB_PROFILE", "tuned")
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "20"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+
+SQLITE_PRAGMAS = {
+    "journal_mode": os.getenv("SQLITE_JOURNAL_MODE", "WAL"),
+    "synchronous": os.getenv("SQLITE_SYNCHRONOUS", "NORMAL"),
+    "mmap_size": int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024))),
+    "cache_size": int(os.getenv("SQLITE_CACHE_SIZE", "-65536")),  # negative = KiB, i.e. 64 MiB
+    "busy_timeout": int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000")),
+    "temp_store": "MEMORY",
+}
+
+
+def _apply_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    for name, value in SQLITE_PRAGMAS.items():
+        cursor.execute(f"PRAGMA {name}={value}")
+    cursor.close()
+
+
+def create_db_engine(url: str = DATABASE_URL, profile: str = DB_PROFILE):
+    if not url.startswith("sqlite"):
+        return create_engine(url, pool_size=DB_POOL_SIZE, max_overflow=DB_MAX_OVERFLOW, pool_pre_ping=True)
+
+    connect_args = {"check_same_thread": False}
+    if url in ("sqlite://", "sqlite:///:memory:"):
+        # One shared connection, otherwise every pooled connection gets its own empty database
+        return create_engine(url, connect_args=connect_args, poolclass=StaticPool)
+    if profile != "tuned":
+        return create_engine(url, connect_args=connect_args)
+
+    # FastAPI runs sync routes on a thread pool; size the pool for it so
+    # requests don't queue on the default 5 connections
+    engine = create_engine(
+        url,
+        connect_args=connect_args,
+        poolclass=QueuePool,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW
+    )
+    event.listen(engine, "connect", _apply_sqlite_pragmas)
+    return engine
+
+
+engine = create_db_engine()
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
+
+
+if __name__ == "__main__":
+    # Benchmark: concurrent journal reads and writes, default vs tuned profile
+    import tempfile
+    import time
+    from concurrent.futures import ThreadPoolExecutor
+    from datetime import date, timedelta
+    from uuid import uuid4
+    from sqlalchemy import text
+
+    WORKERS = 16
+    OPS_PER_WORKER = 100
+
+    def run(profile):
+        path = os.path.join(tempfile.mkdtemp(), "bench.db")
+        bench_engine = create_db_engine(f"sqlite:///{path}", profile)
+        with bench_engine.begin() as conn:
+            conn.execute(text("CREATE TABLE journal_entries (id VARCHAR PRIMARY KEY, text TEXT, date DATE)"))
+            conn.execute(text("CREATE TABLE word_emotions (id VARCHAR PRIMARY KEY, text VARCHAR, emotion VARCHAR, score FLOAT, journal_id VARCHAR)"))
+
+        def worker(n):
+            errors = 0
+            for i in range(OPS_PER_WORKER):
+                try:
+                    with bench_engine.begin() as conn:
+                        if i % 4 == 0:
+                            journal_id = str(uuid4())
+                            conn.execute(
+                                text("INSERT INTO journal_entries (id, text, date) VALUES (:id, :text, :date)"),
+                                {"id": journal_id, "text": "felt calm today " * 20, "date": date(2000, 1, 1) + timedelta(days=n * OPS_PER_WORKER + i)}
+                            )
+                            conn.execute(
+                                text("INSERT INTO word_emotions (id, text, emotion, score, journal_id) VALUES (:id, 'calm', 'joy', 0.9, :journal_id)"),
+                                [{"id": str(uuid4()), "journal_id": journal_id} for _ in range(60)]
+                            )
+                        else:
+                            conn.execute(text("SELECT id, text, date FROM journal_entries ORDER BY date DESC LIMIT 20")).fetchall()
+                except Exception:
+                    errors += 1
+            return errors
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=WORKERS) as pool:
+            errors = sum(pool.map(worker, range(WORKERS)))
+        elapsed = time.perf_counter() - start
+        bench_engine.dispose()
+        total = WORKERS * OPS_PER_WORKER
+        print(f"📊 {profile:>7}: {total} ops in {elapsed:.2f}s ({total / elapsed:.0f} ops/s), {errors} errors")
+
+    run("default")
+    run("tuned")
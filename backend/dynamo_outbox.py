@@ -0,0 +1,180 @@
+import json
+import os
+import threading
+import time
+from decimal import Decimal
+from sqlalchemy import func
+from . import models
+
+# Write-behind mirror of journal changes to DynamoDB.
+# Requests only add an outbox row inside their own SQLite transaction; a
+# background thread drains the outbox with batch_writer and retries failures
+# with exponential backoff, so a slow or failing mirror never loses writes.
+# Only the newest row of an item is ever sent: older rows for the same item
+# are dropped as superseded, so a late retry can't overwrite newer data. A
+# row that still fails after OUTBOX_MAX_ATTEMPTS moves to the dead-letter table.
+
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "25"))
+OUTBOX_FLUSH_INTERVAL = float(os.getenv("OUTBOX_FLUSH_INTERVAL", "1.0"))
+OUTBOX_MAX_BACKOFF = float(os.getenv("OUTBOX_MAX_BACKOFF", "300"))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "10"))
+
+
+class DynamoOutbox:
+    def __init__(self, table, session_factory, batch_size: int = OUTBOX_BATCH_SIZE,
+                 flush_interval: float = OUTBOX_FLUSH_INTERVAL, max_backoff: float = OUTBOX_MAX_BACKOFF,
+                 max_attempts: int = OUTBOX_MAX_ATTEMPTS):
+        self.table = table
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_backoff = max_backoff
+        self.max_attempts = max_attempts
+        self.sent = 0
+        self.superseded = 0
+        self.failed_attempts = 0
+        self.dead_lettered = 0
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def enqueue(self, db, item: dict):
+        """Stage `item` for mirroring; it is written when `db` commits."""
+        now = time.time()
+        db.add(models.DynamoOutbox(
+            item_id=str(item.get("id")),
+            payload=json.dumps(item, default=str),
+            attempts=0,
+            next_attempt_at=now,
+            created_at=now
+        ))
+
+    def notify(self):
+        self._wake.set()
+
+    def flush_once(self) -> int:
+        """Send one batch of due items. Returns how many due outbox rows were handled."""
+        db = self.session_factory()
+        try:
+            rows = (
+                db.query(models.DynamoOutbox)
+                .filter(models.DynamoOutbox.next_attempt_at <= time.time())
+                .order_by(models.DynamoOutbox.id)
+                .limit(self.batch_size)
+                .all()
+            )
+            if not rows:
+                return 0
+
+            # Any newer row for the same item (due or not) supersedes these
+            newest = dict(
+                db.query(models.DynamoOutbox.item_id, func.max(models.DynamoOutbox.id))
+                .filter(models.DynamoOutbox.item_id.in_({row.item_id for row in rows}))
+                .group_by(models.DynamoOutbox.item_id)
+                .all()
+            )
+            to_send = []
+            for row in rows:
+                if row.id < newest[row.item_id]:
+                    db.delete(row)
+                    self.superseded += 1
+                else:
+                    to_send.append(row)
+
+            failures = self._send(to_send)
+            now = time.time()
+            for row in to_send:
+                error = failures.get(row.id)
+                if error is None:
+                    db.delete(row)
+                    self.sent += 1
+                    # Older rows still backing off now hold stale data; they must never be sent
+                    self.superseded += db.query(models.DynamoOutbox).filter(
+                        models.DynamoOutbox.item_id == row.item_id,
+                        models.DynamoOutbox.id < row.id
+                    ).delete(synchronize_session=False)
+                    continue
+                self.failed_attempts += 1
+                row.attempts = (row.attempts or 0) + 1
+                row.last_error = str(error)
+                if row.attempts >= self.max_attempts:
+                    print(f"☠️ DynamoDB outbox item {row.item_id} dead-lettered after {row.attempts} attempts:", error)
+                    db.add(models.DynamoOutboxDeadLetter(
+                        id=row.id, item_id=row.item_id, payload=row.payload, attempts=row.attempts,
+                        created_at=row.created_at, failed_at=now, last_error=row.last_error
+                    ))
+                    db.delete(row)
+                    self.dead_lettered += 1
+                else:
+                    row.next_attempt_at = now + min(2 ** row.attempts, self.max_backoff)
+            db.commit()
+            return len(rows)
+        finally:
+            db.close()
+
+    def _send(self, rows):
+        """Write the rows' items; returns {row id: error} for the ones that failed."""
+        if not rows:
+            return {}
+        try:
+            with self.table.batch_writer() as batch:
+                for row in rows:
+                    batch.put_item(Item=json.loads(row.payload, parse_float=Decimal))
+            return {}
+        except Exception as e:
+            print(f"❌ DynamoDB outbox flush failed ({len(rows)} items), retrying item by item:", e)
+
+        # One bad item fails the whole batch request; item by item, only it is backed off
+        failures = {}
+        for row in rows:
+            try:
+                self.table.put_item(Item=json.loads(row.payload, parse_float=Decimal))
+            except Exception as e:
+                failures[row.id] = e
+        return failures
+
+    def depth(self) -> int:
+        db = self.session_factory()
+        try:
+            return db.query(models.DynamoOutbox).count()
+        finally:
+            db.close()
+
+    def stats(self):
+        return {
+            "queue_depth": self.depth(),
+            "sent": self.sent,
+            "superseded": self.superseded,
+            "failed_attempts": self.failed_attempts,
+            "dead_lettered": self.dead_lettered,
+            "running": bool(self._thread and self._thread.is_alive())
+        }
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                while self.flush_once() == self.batch_size:
+                    pass
+            except Exception as e:
+                print("⚠️ DynamoDB outbox error:", e)
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="dynamo-outbox", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 10.0):
+        self._stop.set()
+        self._wake.set()
+        if self._thread:
+            self._thread.join(timeout)
+        # Best-effort drain of anything still due before shutdown
+        try:
+            while self.flush_once():
+                pass
+        except Exception as e:
+            print("⚠️ DynamoDB outbox final flush failed:", e)
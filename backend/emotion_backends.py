@@ -0,0 +1,159 @@
+import os
+import threading
+import time
+import numpy as np
+import requests
+
+# Pluggable emotion classifiers for journal analysis.
+# Every backend takes a list of texts and returns, per text, a list of
+# {"label", "score"} dicts sorted by score (the Hugging Face inference API shape).
+# Selected with EMOTION_BACKEND:
+#   hf-api        Hugging Face hosted inference (default)
+#   onnx          ONNX Runtime on CPU, model exported to EMOTION_ONNX_MODEL_DIR
+#   transformers  local PyTorch model with dynamic int8 quantization
+#   stub          deterministic offline classifier for benchmarks
+
+EMOTION_BACKEND = os.getenv("EMOTION_BACKEND", "hf-api")
+EMOTION_MODEL_ID = os.getenv("EMOTION_MODEL_ID", "j-hartmann/emotion-english-distilroberta-base")
+EMOTION_ONNX_MODEL_DIR = os.getenv("EMOTION_ONNX_MODEL_DIR", "./models/emotion-onnx")
+EMOTION_MAX_LENGTH = int(os.getenv("EMOTION_MAX_LENGTH", "512"))
+EMOTION_CPU_THREADS = int(os.getenv("EMOTION_CPU_THREADS", "0"))  # 0 = runtime default
+
+
+def _softmax_results(logits: np.ndarray, id2label):
+    shifted = logits - logits.max(axis=-1, keepdims=True)
+    probs = np.exp(shifted)
+    probs /= probs.sum(axis=-1, keepdims=True)
+    results = []
+    for row in probs:
+        order = np.argsort(-row)
+        results.append([{"label": id2label[int(i)], "score": float(row[i])} for i in order])
+    return results
+
+
+class HuggingFaceAPIBackend:
+    name = "hf-api"
+
+    def __init__(self, model_id: str = EMOTION_MODEL_ID):
+        token = os.getenv("HF_API_TOKEN")
+        if token is None:
+            raise RuntimeError("HF_API_TOKEN not found. Check your .env file.")
+        self.model_id = model_id
+        self.url = f"https://api-inference.huggingface.co/models/{model_id}"
+        self.session = requests.Session()
+        self.session.headers["Authorization"] = f"Bearer {token}"
+
+    def classify(self, texts):
+        response = self.session.post(self.url, json={"inputs": texts})
+        response.raise_for_status()
+        return response.json()
+
+
+class OnnxEmotionBackend:
+    name = "onnx"
+
+    def __init__(self, model_dir: str = EMOTION_ONNX_MODEL_DIR):
+        # Export once with: optimum-cli export onnx --model <EMOTION_MODEL_ID> <model_dir>
+        import onnxruntime as ort
+        from transformers import AutoConfig, AutoTokenizer
+
+        self.model_id = EMOTION_MODEL_ID
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+        self.id2label = AutoConfig.from_pretrained(model_dir).id2label
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if EMOTION_CPU_THREADS:
+            options.intra_op_num_threads = EMOTION_CPU_THREADS
+        self.session = ort.InferenceSession(
+            os.path.join(model_dir, "model.onnx"), options, providers=["CPUExecutionProvider"]
+        )
+        self.input_names = {i.name for i in self.session.get_inputs()}
+
+    def classify(self, texts):
+        encoded = self.tokenizer(
+            texts, padding=True, truncation=True, max_length=EMOTION_MAX_LENGTH, return_tensors="np"
+        )
+        inputs = {name: encoded[name].astype(np.int64) for name in self.input_names if name in encoded}
+        logits = self.session.run(None, inputs)[0]
+        return _softmax_results(logits, self.id2label)
+
+
+class TransformersEmotionBackend:
+    name = "transformers"
+
+    def __init__(self, model_id: str = EMOTION_MODEL_ID):
+        import torch
+        from transformers import AutoModelForSequenceClassification, AutoTokenizer
+
+        if EMOTION_CPU_THREADS:
+            torch.set_num_threads(EMOTION_CPU_THREADS)
+        self.torch = torch
+        self.model_id = model_id
+        self.tokenizer = AutoTokenizer.from_pretrained(model_id)
+        model = AutoModelForSequenceClassification.from_pretrained(model_id).eval()
+        self.model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        self.id2label = model.config.id2label
+
+    def classify(self, texts):
+        encoded = self.tokenizer(
+            texts, padding=True, truncation=True, max_length=EMOTION_MAX_LENGTH, return_tensors="pt"
+        )
+        with self.torch.inference_mode():
+            logits = self.model(**encoded).logits.numpy()
+        return _softmax_results(logits, self.id2label)
+
+
+class StubEmotionBackend:
+    name = "stub"
+
+    def __init__(self, latency: float = 0.0):
+        self.model_id = "stub"
+        self.latency = latency
+
+    def classify(self, texts):
+        from .emotion_batch import stub_classify_batch
+        return stub_classify_batch(texts, latency=self.latency)
+
+
+BACKENDS = {
+    "hf-api": HuggingFaceAPIBackend,
+    "onnx": OnnxEmotionBackend,
+    "transformers": TransformersEmotionBackend,
+    "stub": StubEmotionBackend,
+}
+
+
+def emotion_cache_model_id():
+    # Local backends score slightly differently from the hosted model, so they get their own cache entries
+    if EMOTION_BACKEND == "hf-api":
+        return EMOTION_MODEL_ID
+    return f"{EMOTION_MODEL_ID}@{EMOTION_BACKEND}"
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_emotion_backend():
+    """The configured backend, created (and its model loaded) once per process."""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                if EMOTION_BACKEND not in BACKENDS:
+                    raise RuntimeError(f"Unknown EMOTION_BACKEND '{EMOTION_BACKEND}'. Use one of: {', '.join(BACKENDS)}")
+                _backend = BACKENDS[EMOTION_BACKEND]()
+    return _backend
+
+
+if __name__ == "__main__":
+    # Benchmark: per-token latency of the configured backend on word batches
+    backend = get_emotion_backend()
+    words = ("today I felt tired after work but talking to a friend helped me feel calmer " * 20).split()
+    backend.classify(words[:8])  # warm-up
+
+    start = time.perf_counter()
+    results = backend.classify(words)
+    elapsed = time.perf_counter() - start
+    print(f"📊 {backend.name}: {len(words)} tokens in {elapsed * 1000:.1f}ms ({elapsed * 1000 / len(words):.2f}ms/token)")
+    print(f"🔎 '{words[0]}' → {results[0][0]}")
@@ -0,0 +1,106 @@
+import os
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from .emotion_cache import WordEmotionCache, normalize_word
+
+# Batched word-level emotion classification.
+# Instead of one HTTP round trip per token, unique tokens are sent in chunks
+# as a single `inputs` list and the chunks run concurrently.
+
+EMOTION_BATCH_SIZE = int(os.getenv("EMOTION_BATCH_SIZE", "32"))
+EMOTION_MAX_CONCURRENCY = int(os.getenv("EMOTION_MAX_CONCURRENCY", "4"))
+
+EMOTION_LABELS = ["anger", "disgust", "fear", "joy", "neutral", "sadness", "surprise"]
+
+
+def chunked(items, size):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def classify_words(words, classify_batch, batch_size=None, max_concurrency=None, cache=None):
+    """Classify `words` and return one result list per position.
+
+    `classify_batch` takes a list of strings and returns one list of
+    {"label", "score"} dicts per string, in the same order (the shape the
+    Hugging Face inference API returns for a list of `inputs`).
+    With a `WordEmotionCache`, words are normalized first and only cache
+    misses are sent to `classify_batch`.
+    """
+    batch_size = batch_size or EMOTION_BATCH_SIZE
+    max_concurrency = max_concurrency or EMOTION_MAX_CONCURRENCY
+
+    keys = [normalize_word(word) for word in words] if cache is not None else list(words)
+    unique_words = list(dict.fromkeys(keys))
+    if not unique_words:
+        return []
+
+    by_word = cache.get_many(unique_words) if cache is not None else {}
+    to_classify = [word for word in unique_words if word not in by_word]
+    new_results = _classify_unique(to_classify, classify_batch, batch_size, max_concurrency)
+    if cache is not None:
+        cache.put_many(new_results)
+    by_word.update(new_results)
+
+    return [by_word[key] for key in keys]
+
+
+def _classify_unique(unique_words, classify_batch, batch_size, max_concurrency):
+    if not unique_words:
+        return {}
+
+    chunks = list(chunked(unique_words, batch_size))
+    if len(chunks) == 1:
+        chunk_results = [classify_batch(chunks[0])]
+    else:
+        with ThreadPoolExecutor(max_workers=min(max_concurrency, len(chunks))) as pool:
+            chunk_results = list(pool.map(classify_batch, chunks))
+
+    by_word = {}
+    for chunk, results in zip(chunks, chunk_results):
+        if len(results) != len(chunk):
+            raise ValueError(f"Emotion batch returned {len(results)} results for {len(chunk)} inputs")
+        by_word.update(zip(chunk, results))
+    return by_word
+
+
+def stub_classify_batch(texts, latency: float = 0.02):
+    """Offline stand-in for the HF API: fixed latency per request, deterministic labels."""
+    time.sleep(latency)
+    results = []
+    for text in texts:
+        seed = zlib.crc32(text.encode("utf-8"))
+        top = EMOTION_LABELS[seed % len(EMOTION_LABELS)]
+        top_score = round(0.4 + (seed % 600) / 1000, 3)
+        rest = round((1 - top_score) / (len(EMOTION_LABELS) - 1), 3)
+        results.append(
+            [{"label": top, "score": top_score}]
+            + [{"label": label, "score": rest} for label in EMOTION_LABELS if label != top]
+        )
+    return results
+
+
+if __name__ == "__main__":
+    # Benchmark: per-word requests vs batched requests against the stub classifier
+    sample = ("today I felt tired after work but talking to a friend helped me feel calmer " * 20).split()
+
+    start = time.perf_counter()
+    sequential = [stub_classify_batch([word])[0] for word in sample]
+    sequential_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    batched = classify_words(sample, stub_classify_batch)
+    batched_time = time.perf_counter() - start
+
+    assert batched == sequential
+    print(f"📊 {len(sample)} words, {len(set(sample))} unique")
+    print(f"🐢 per-word: {sequential_time:.2f}s")
+    print(f"🚀 batched:  {batched_time:.2f}s ({sequential_time / batched_time:.0f}x faster)")
+
+    # Second entry sharing most of its vocabulary: nearly everything is a cache hit
+    cache = WordEmotionCache("stub", db_path=":memory:")
+    classify_words(sample, stub_classify_batch, cache=cache)
+    start = time.perf_counter()
+    classify_words("today work felt calmer after talking to a friend".split(), stub_classify_batch, cache=cache)
+    print(f"🗃️ cached:   {time.perf_counter() - start:.4f}s {cache.stats()}")
@@ -0,0 +1,108 @@
+import json
+import os
+import sqlite3
+import string
+import threading
+from collections import OrderedDict
+
+# Two-tier cache for word-level emotion results, shared across journal entries.
+# Tier 1 is a bounded in-memory LRU, tier 2 is a SQLite file next to journal.db,
+# so labels survive restarts. Entries are keyed on (model_id, normalized word).
+
+EMOTION_CACHE_PATH = os.getenv("EMOTION_CACHE_PATH", "./word_emotion_cache.db")
+EMOTION_CACHE_MAX_ENTRIES = int(os.getenv("EMOTION_CACHE_MAX_ENTRIES", "50000"))
+
+_STRIP_CHARS = string.punctuation + string.whitespace + "“”‘’…"
+
+
+def normalize_word(word: str) -> str:
+    normalized = word.strip(_STRIP_CHARS).lower()
+    return normalized or word.strip().lower()
+
+
+class WordEmotionCache:
+    def __init__(self, model_id: str, db_path: str = EMOTION_CACHE_PATH, max_entries: int = EMOTION_CACHE_MAX_ENTRIES):
+        self.model_id = model_id
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn = None
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def _db(self):
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS word_emotion_cache ("
+                "model_id TEXT NOT NULL, word TEXT NOT NULL, result TEXT NOT NULL, "
+                "PRIMARY KEY (model_id, word))"
+            )
+            self._conn.commit()
+        return self._conn
+
+    def _remember(self, word, result):
+        self._memory[word] = result
+        self._memory.move_to_end(word)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def get_many(self, words):
+        """Return {word: result} for the normalized `words` that are cached."""
+        found = {}
+        with self._lock:
+            missing = []
+            for word in words:
+                if word in self._memory:
+                    self._memory.move_to_end(word)
+                    found[word] = self._memory[word]
+                else:
+                    missing.append(word)
+            self.memory_hits += len(found)
+
+            if missing:
+                try:
+                    placeholders = ",".join("?" * len(missing))
+                    rows = self._db().execute(
+                        f"SELECT word, result FROM word_emotion_cache WHERE model_id = ? AND word IN ({placeholders})",
+                        [self.model_id, *missing]
+                    ).fetchall()
+                except sqlite3.Error as e:
+                    print(f"⚠️ Emotion cache read failed: {e}")
+                    rows = []
+                for word, result in rows:
+                    result = json.loads(result)
+                    found[word] = result
+                    self._remember(word, result)
+                self.disk_hits += len(rows)
+                self.misses += len(missing) - len(rows)
+        return found
+
+    def put_many(self, results: dict):
+        if not results:
+            return
+        with self._lock:
+            for word, result in results.items():
+                self._remember(word, result)
+            try:
+                self._db().executemany(
+                    "INSERT OR REPLACE INTO word_emotion_cache (model_id, word, result) VALUES (?, ?, ?)",
+                    [(self.model_id, word, json.dumps(result)) for word, result in results.items()]
+                )
+                self._db().commit()
+            except sqlite3.Error as e:
+                print(f"⚠️ Emotion cache write failed: {e}")
+
+    def stats(self):
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        return {
+            "model_id": self.model_id,
+            "memory_entries": len(self._memory),
+            "max_entries": self.max_entries,
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_ratio": round((self.memory_hits + self.disk_hits) / lookups, 3) if lookups else 0.0
+        }
@@ -0,0 +1,200 @@
+from datetime import date, timedelta
+import numpy as np
+from sqlalchemy import Date, bindparam, select, text
+from sqlalchemy.dialects.sqlite import insert
+from . import models
+
+# Per-day and per-week emotion aggregates over journal entries.
+# Rows are updated incrementally whenever a journal entry is created or edited,
+# so trend queries read a handful of aggregate rows instead of every entry.
+
+PERIODS = ("day", "week")
+
+
+def period_start(entry_date: date, period: str) -> date:
+    if period == "week":
+        return entry_date - timedelta(days=entry_date.weekday())
+    return entry_date
+
+
+# Aggregates are incremented in SQL rather than read, modified and written back
+# through the ORM, so concurrent journal writes in the same week can't lose updates
+_INCREMENT = text("""
+    UPDATE emotion_aggregates SET
+        emotion_counts = CASE
+            WHEN coalesce(json_extract(emotion_counts, :path), 0) + :sign > 0
+            THEN json_set(coalesce(emotion_counts, '{}'), :path, coalesce(json_extract(emotion_counts, :path), 0) + :sign)
+            ELSE json_remove(coalesce(emotion_counts, '{}'), :path)
+        END,
+        entry_count = coalesce(entry_count, 0) + :sign,
+        dominant_score_sum = coalesce(dominant_score_sum, 0.0) + :dominant_delta,
+        stress_score_sum = coalesce(stress_score_sum, 0.0) + :stress_delta,
+        stress_count = coalesce(stress_count, 0) + :stress_sign
+    WHERE period = :period AND period_start = :period_start
+""").bindparams(bindparam("period_start", type_=Date))
+
+
+def _ensure_row(db, period: str, start: date):
+    db.execute(
+        insert(models.EmotionAggregate)
+        .values(
+            period=period, period_start=start, entry_count=0, emotion_counts={},
+            dominant_score_sum=0.0, stress_score_sum=0.0, stress_count=0
+        )
+        .on_conflict_do_nothing()
+    )
+
+
+def _apply(db, period: str, start: date, emotion: str, dominant_score: float, stress_score, sign: int):
+    emotion = emotion or "unknown"
+    db.execute(_INCREMENT, {
+        "period": period,
+        "period_start": start,
+        "path": f'$."{emotion}"',
+        "sign": sign,
+        "dominant_delta": sign * (dominant_score or 0.0),
+        "stress_delta": sign * stress_score if stress_score is not None else 0.0,
+        "stress_sign": sign if stress_score is not None else 0
+    })
+
+
+def record_journal_scores(db, entry_date: date, dominant_emotion: str, dominant_score: float, stress_score=None):
+    """Fold a created or edited entry into the aggregates (within `db`'s transaction).
+
+    There is one journal entry per date, so the day row holds the previous
+    version of an edited entry; it is subtracted from the week before the new
+    values are added. `stress_score=None` keeps the previous stress score.
+    """
+    week_start = period_start(entry_date, "week")
+    # Inserting first takes SQLite's write lock, so the day row read below
+    # can't change under us before the increments land
+    _ensure_row(db, "day", entry_date)
+    _ensure_row(db, "week", week_start)
+
+    day = db.execute(
+        select(
+            models.EmotionAggregate.entry_count, models.EmotionAggregate.emotion_counts,
+            models.EmotionAggregate.dominant_score_sum, models.EmotionAggregate.stress_score_sum,
+            models.EmotionAggregate.stress_count
+        ).where(models.EmotionAggregate.period == "day", models.EmotionAggregate.period_start == entry_date)
+    ).one()
+
+    if day.entry_count:
+        previous_emotion = next(iter(day.emotion_counts or {}), None)
+        previous_stress = day.stress_score_sum if day.stress_count else None
+        if stress_score is None:
+            stress_score = previous_stress
+        _apply(db, "week", week_start, previous_emotion, day.dominant_score_sum, previous_stress, -1)
+        _apply(db, "day", entry_date, previous_emotion, day.dominant_score_sum, previous_stress, -1)
+
+    _apply(db, "day", entry_date, dominant_emotion, dominant_score, stress_score, 1)
+    _apply(db, "week", week_start, dominant_emotion, dominant_score, stress_score, 1)
+
+
+def rebuild_emotion_aggregates(db):
+    """Recompute all aggregates from journal_entries (stress scores live only in DynamoDB, so they start empty)."""
+    db.query(models.EmotionAggregate).delete()
+    for entry_date, emotion, score in db.query(
+        models.JournalEntry.date, models.JournalEntry.dominant_emotion, models.JournalEntry.dominant_score
+    ).order_by(models.JournalEntry.date):
+        record_journal_scores(db, entry_date, emotion, score)
+        db.flush()
+    db.commit()
+
+
+def rolling_mean(values: np.ndarray, window: int) -> np.ndarray:
+    """Trailing mean over `window` periods, ignoring NaN gaps (NaN if the window has no data)."""
+    present = ~np.isnan(values)
+    sums = np.concatenate(([0.0], np.cumsum(np.where(present, values, 0.0))))
+    counts = np.concatenate(([0], np.cumsum(present)))
+    idx = np.arange(1, len(values) + 1)
+    lo = np.maximum(idx - window, 0)
+    window_counts = counts[idx] - counts[lo]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(window_counts > 0, (sums[idx] - sums[lo]) / window_counts, np.nan)
+
+
+def emotion_streaks(codes: np.ndarray, labels):
+    """Run lengths of consecutive periods with the same dominant emotion (-1 = no entry)."""
+    if len(codes) == 0:
+        return {"current": None, "longest": {}}
+    boundaries = np.flatnonzero(np.diff(codes)) + 1
+    starts = np.concatenate(([0], boundaries))
+    lengths = np.diff(np.concatenate((starts, [len(codes)])))
+    run_codes = codes[starts]
+
+    longest = {}
+    for label_id, label in enumerate(labels):
+        mask = run_codes == label_id
+        if mask.any():
+            longest[label] = int(lengths[mask].max())
+
+    current = None
+    if run_codes[-1] >= 0:
+        current = {"emotion": labels[run_codes[-1]], "length": int(lengths[-1])}
+    return {"current": current, "longest": longest}
+
+
+def _to_json(values: np.ndarray):
+    return [None if np.isnan(v) else round(float(v), 3) for v in values]
+
+
+def emotion_timeseries(db, start: date, end: date, period: str = "day", window: int = 7):
+    first = period_start(start, period)
+    step = 7 if period == "week" else 1
+    n = (end - first).days // step + 1
+
+    rows = (
+        db.query(models.EmotionAggregate)
+        .filter(
+            models.EmotionAggregate.period == period,
+            models.EmotionAggregate.period_start >= first,
+            models.EmotionAggregate.period_start <= end
+        )
+        .all()
+    )
+
+    dominant_mean = np.full(n, np.nan)
+    stress_mean = np.full(n, np.nan)
+    entry_counts = np.zeros(n, dtype=np.int64)
+    codes = np.full(n, -1, dtype=np.int64)
+    labels = []
+    periods = []
+
+    for row in rows:
+        if not row.entry_count:
+            continue
+        i = (row.period_start - first).days // step
+        entry_counts[i] = row.entry_count
+        dominant_mean[i] = row.dominant_score_sum / row.entry_count
+        if row.stress_count:
+            stress_mean[i] = row.stress_score_sum / row.stress_count
+        top_emotion = max(row.emotion_counts, key=row.emotion_counts.get)
+        if top_emotion not in labels:
+            labels.append(top_emotion)
+        codes[i] = labels.index(top_emotion)
+        periods.append({
+            "start": row.period_start.isoformat(),
+            "entry_count": row.entry_count,
+            "emotion_counts": row.emotion_counts,
+            "mean_dominant_score": round(float(dominant_mean[i]), 3),
+            "mean_stress_score": None if np.isnan(stress_mean[i]) else round(float(stress_mean[i]), 3)
+        })
+
+    periods.sort(key=lambda p: p["start"])
+    return {
+        "period": period,
+        "start": first.isoformat(),
+        "end": end.isoformat(),
+        "window": window,
+        "periods": periods,
+        "series": {
+            "starts": [(first + timedelta(days=i * step)).isoformat() for i in range(n)],
+            "entry_count": entry_counts.tolist(),
+            "mean_dominant_score": _to_json(dominant_mean),
+            "mean_stress_score": _to_json(stress_mean),
+            "dominant_score_moving_avg": _to_json(rolling_mean(dominant_mean, window)),
+            "stress_score_moving_avg": _to_json(rolling_mean(stress_mean, window))
+        },
+        "streaks": emotion_streaks(codes, labels)
+    }
@@ -0,0 +1,212 @@
+import os
+import queue
+import re
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+# Micro-batching for Granite risk evaluations.
+# Callers block on generate_text(prompt) as before; behind it, prompts that
+# arrive within GRANITE_BATCH_WINDOW of each other are sent to
+# ModelInference.generate as one list prompt (the SDK fans a list out over
+# concurrency_limit parallel requests), and each answer is routed back to its
+# caller. One batcher wraps one ModelInference instance.
+#
+# The app's Granite model and its batcher are lazy singletons shared by the
+# journal, habit and tweet routers: the watsonx SDK is imported and the
+# client authenticated on first use, not when the app is imported.
+
+GRANITE_BATCH_WINDOW = float(os.getenv("GRANITE_BATCH_WINDOW", "0.05"))
+GRANITE_BATCH_MAX = int(os.getenv("GRANITE_BATCH_MAX", "16"))
+GRANITE_CONCURRENCY_LIMIT = int(os.getenv("GRANITE_CONCURRENCY_LIMIT", "8"))  # watsonx allows at most 10
+GRANITE_BATCHES_IN_FLIGHT = int(os.getenv("GRANITE_BATCHES_IN_FLIGHT", "2"))
+
+_model_lock = threading.Lock()
+_guardian_model = None
+_granite_batcher = None
+
+
+def parse_risk_output(result_text: str):
+    """(harm label, confidence string, explanation) from Granite's <harm>/<confidence>/<comment> answer."""
+    label_match = re.search(r"<harm>(.*?)</harm>", result_text)
+    confidence_match = re.search(r"<confidence>(.*?)</confidence>", result_text)
+    explanation_match = re.search(r"<comment>(.*?)</comment>", result_text)
+
+    label = label_match.group(1).strip() if label_match else "Unknown"
+    confidence_str = confidence_match.group(1).strip() if confidence_match else "Unknown"
+    explanation = explanation_match.group(1).strip() if explanation_match else "Not provided"
+    return label, confidence_str, explanation
+
+
+class GraniteBatcher:
+    def __init__(self, model, window: float = GRANITE_BATCH_WINDOW, max_batch: int = GRANITE_BATCH_MAX,
+                 concurrency_limit: int = GRANITE_CONCURRENCY_LIMIT, in_flight: int = GRANITE_BATCHES_IN_FLIGHT):
+        self.model = model
+        self.window = window
+        self.max_batch = max_batch
+        self.concurrency_limit = concurrency_limit
+        self._queue = queue.Queue()
+        self._slots = threading.Semaphore(in_flight)
+        self._senders = ThreadPoolExecutor(max_workers=in_flight, thread_name_prefix="granite-batch")
+        self._thread = None
+        self._lock = threading.Lock()
+        self.batches = 0
+        self.prompts = 0
+
+    def _ensure_worker(self):
+        if self._thread is None or not self._thread.is_alive():
+            with self._lock:
+                if self._thread is None or not self._thread.is_alive():
+                    self._thread = threading.Thread(target=self._run, name="granite-batcher", daemon=True)
+                    self._thread.start()
+
+    def submit(self, prompt: str) -> Future:
+        future = Future()
+        self._queue.put((prompt, future))
+        self._ensure_worker()
+        return future
+
+    def generate_text(self, prompt: str) -> str:
+        """Granite's generated text for `prompt`, sent together with any concurrent prompts."""
+        return self.submit(prompt).result()
+
+    def evaluate_risk(self, prompt: str):
+        """parse_risk_output() of the answer to a risk-evaluation prompt."""
+        return parse_risk_output(self.generate_text(prompt))
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.window
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            self._slots.acquire()  # at most `in_flight` batches waiting on Granite
+            self._senders.submit(self._send, batch)
+
+    def _send(self, batch):
+        prompts = [prompt for prompt, _ in batch]
+        try:
+            if len(prompts) == 1:
+                responses = [self.model.generate(prompts[0])]
+            else:
+                responses = self.model.generate(prompt=prompts, concurrency_limit=self.concurrency_limit)
+            texts = [response["results"][0]["generated_text"] for response in responses]
+            if len(texts) != len(batch):
+                raise RuntimeError(f"Granite returned {len(texts)} answers for {len(batch)} prompts")
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+        else:
+            for (_, future), text in zip(batch, texts):
+                future.set_result(text)
+        finally:
+            self._slots.release()
+            with self._lock:
+                self.batches += 1
+                self.prompts += len(batch)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "batches": self.batches,
+                "prompts": self.prompts,
+                "avg_batch_size": round(self.prompts / self.batches, 2) if self.batches else 0.0
+            }
+
+
+def get_guardian_model():
+    """The Granite ModelInference, created (and authenticated) on first use."""
+    global _guardian_model
+    if _guardian_model is None:
+        with _model_lock:
+            if _guardian_model is None:
+                # The SDK alone takes seconds to import
+                from ibm_watsonx_ai.credentials import Credentials
+                from ibm_watsonx_ai.foundation_models import ModelInference
+
+                credentials = Credentials(
+                    url="https://eu-de.ml.cloud.ibm.com",  # or regional Watsonx URL
+                    api_key=os.getenv("WATSONX_API_KEY")
+                )
+                _guardian_model = ModelInference(
+                    model_id="ibm/granite-3-3-8b-instruct",  # ⚠️ A supported model with long-term viability
+                    credentials=credentials,
+                    project_id="1cb8c38f-d650-41fe-9836-86659006c090",
+                    params={"decoding_method": "greedy", "max_new_tokens": 100}
+                )
+    return _guardian_model
+
+
+def get_granite_batcher():
+    # Concurrent risk evaluations share list-prompt calls to Granite
+    global _granite_batcher
+    if _granite_batcher is None:
+        model = get_guardian_model()
+        with _model_lock:
+            if _granite_batcher is None:
+                _granite_batcher = GraniteBatcher(model)
+    return _granite_batcher
+
+
+class FakeModelInference:
+    """Local stand-in for ModelInference.generate, for throughput benchmarks.
+
+    Each call pays a fixed request latency; the service accepts `max_calls`
+    calls at once, and a list prompt is answered `concurrency_limit` items at a
+    time within one call, like the SDK's parallel fan-out over one session.
+    """
+
+    def __init__(self, latency: float = 0.4, item_latency: float = 0.05, max_calls: int = 4):
+        self.latency = latency
+        self.item_latency = item_latency
+        self._slots = threading.Semaphore(max_calls)
+        self.calls = 0
+
+    def _answer(self, prompt: str) -> dict:
+        risky = any(word in prompt.lower() for word in ("hopeless", "give up", "can't go on"))
+        text = (f"<harm>{'Yes' if risky else 'No'}</harm><confidence>{0.91 if risky else 0.12}</confidence>"
+                f"<comment>{'Expresses hopelessness.' if risky else 'Everyday frustration.'}</comment>")
+        return {"results": [{"generated_text": text}]}
+
+    def generate(self, prompt=None, params=None, concurrency_limit: int = 1, **kwargs):
+        with self._slots:
+            self.calls += 1
+            prompts = prompt if isinstance(prompt, list) else [prompt]
+            waves = -(-len(prompts) // max(1, concurrency_limit))
+            time.sleep(self.latency + self.item_latency * waves)
+            answers = [self._answer(p) for p in prompts]
+        return answers if isinstance(prompt, list) else answers[0]
+
+
+if __name__ == "__main__":
+    # Benchmark: 120 risk evaluations from 24 concurrent callers
+    CALLERS = 24
+    prompts = [f"<risk_evaluation><text>entry {i}: {'I feel hopeless' if i % 10 == 0 else 'long day at work'}</text></risk_evaluation>"
+               for i in range(120)]
+
+    def run(label, evaluate, model):
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=CALLERS) as pool:
+            results = list(pool.map(evaluate, prompts))
+        elapsed = time.perf_counter() - start
+        risky = sum(1 for harm, _, _ in results if harm == "Yes")
+        print(f"📊 {label:>9}: {len(prompts)} prompts in {elapsed:.2f}s ({len(prompts) / elapsed:.1f}/s), "
+              f"{model.calls} model calls, {risky} flagged")
+
+    model = FakeModelInference()
+    run("per-call", lambda p: parse_risk_output(model.generate(p)["results"][0]["generated_text"]), model)
+
+    model = FakeModelInference()
+    batcher = GraniteBatcher(model)
+    run("batched", batcher.evaluate_risk, model)
+    print(f"📈 {batcher.stats()}")
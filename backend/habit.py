@@ -5,14 +5,13 @@ from dotenv import load_dotenv
 import os
 import requests
 from fastapi.middleware.cors import CORSMiddleware
-from ibm_watsonx_ai.credentials import Credentials
-from ibm_watsonx_ai import APIClient
-from ibm_watsonx_ai.foundation_models import ModelInference
 from boto3.dynamodb.conditions import Key
 from uuid import uuid4
 from datetime import datetime
 from decimal import Decimal
 from uuid import UUID
+from .habit_reminders import pending_habit_cache
+from .granite_batch import get_guardian_model
 
 
 class HabitProgressInput(BaseModel):
@@ -38,21 +37,6 @@ table = dynamodb.Table("HabitFlowProgress")  # make sure this exists
 load_dotenv()
 
 
-
-API_KEY = os.getenv("WATSONX_API_KEY")
-credentials = Credentials(
-    url="https://eu-de.ml.cloud.ibm.com",  # or regional Watsonx URL
-    api_key=os.getenv("WATSONX_API_KEY")
-)
-client = APIClient(credentials)
-
-guardian_model = ModelInference(
-    model_id="ibm/granite-3-3-8b-instruct",  # ⚠️ A supported model with long-term viability
-    credentials=credentials,
-    project_id="1cb8c38f-d650-41fe-9836-86659006c090",
-    params={"decoding_method": "greedy", "max_new_tokens": 100}
-)
-
 class HabitInput(BaseModel):
     bad_habit: str
 
@@ -64,7 +48,7 @@ def suggest_replacements(data: HabitInput):
             "Make each suggestion concise (max 5 words) and list them as bullet points."
         )
 
-        response = guardian_model.generate(prompt)
+        response = get_guardian_model().generate(prompt)
         raw = response["results"][0]["generated_text"]
 
         suggestions = [line.strip("-•* ").strip() for line in raw.split("\n") if line.strip()]
@@ -87,6 +71,7 @@ def save_progress(data: HabitProgressInput):
         "last_completed": data.last_completed,
         "is_active": True
     })
+    pending_habit_cache.invalidate(data.user_id)
     return {"message": "✅ Habit progress saved separately!"}
 
 @router.get("/habitflow/get-progress")
@@ -128,6 +113,7 @@ def increment_streak(data: StreakUpdateInput):
                 ":lv": Decimal(str(new_level))
             }
         )
+        pending_habit_cache.invalidate(data.user_id)
         return {"message": "✅ Day added, streak updated!"}
     except Exception as e:
         print("❌ Increment streak error:", str(e))
@@ -0,0 +1,45 @@
+import threading
+
+# Per-user, per-day cache of a user's HabitFlowProgress items for chat reminders.
+# The first chat message of the day loads the user's habits with one partition
+# query; later messages reuse the cached copy, so the chat hot path does no
+# Dynamo reads until the habitflow endpoints write and invalidate the user.
+
+
+class PendingHabitCache:
+    def __init__(self):
+        self._entries = {}  # user_id -> (day, habit items)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, user_id: str, day: str):
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and entry[0] == day:
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            return None
+
+    def put(self, user_id: str, day: str, habits):
+        with self._lock:
+            # Entries from previous days are useless; drop them as the day rolls over
+            stale = [uid for uid, (cached_day, _) in self._entries.items() if cached_day != day]
+            for uid in stale:
+                del self._entries[uid]
+            self._entries[user_id] = (day, habits)
+
+    def invalidate(self, user_id: str = None):
+        with self._lock:
+            if user_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(user_id, None)
+
+    def stats(self):
+        with self._lock:
+            return {"users": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+pending_habit_cache = PendingHabitCache()
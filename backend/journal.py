@@ -1,36 +1,31 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from typing import List
+from typing import List, Optional
 from uuid import uuid4
 from datetime import date, datetime
-from sqlalchemy.orm import Session
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import Session, selectinload
 from .database import Base, SessionLocal, engine
 from . import models
+from .emotion_batch import classify_words
+from .emotion_cache import WordEmotionCache
+from .emotion_backends import emotion_cache_model_id, get_emotion_backend
+from .dynamo_outbox import DynamoOutbox
+from .migrate_word_emotions import ensure_packed_column
+from .word_emotion_codec import pack_word_emotions, unpack_word_emotions
+from .granite_batch import get_granite_batcher
+from .emotion_timeseries import PERIODS, emotion_timeseries, rebuild_emotion_aggregates, record_journal_scores
 import requests
 import os
+import difflib
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 import boto3
-from decimal import Decimal
 load_dotenv()
-from ibm_watsonx_ai.foundation_models import ModelInference
-from ibm_watsonx_ai.credentials import Credentials
-from ibm_watsonx_ai import APIClient
-import re
-
-# Watsonx credentials
-credentials = Credentials(
-    url="https://eu-de.ml.cloud.ibm.com",
-    api_key=os.getenv("WATSONX_API_KEY")
-)
-client = APIClient(credentials)
-
-guardian_model = ModelInference(
-    model_id="ibm/granite-3-3-8b-instruct",
-    credentials=credentials,
-    project_id="1cb8c38f-d650-41fe-9836-86659006c090",
-    params={"decoding_method": "greedy", "max_new_tokens": 100}
-)
 
 
 AWS_REGION = "ap-south-1"
@@ -39,6 +34,7 @@ FIXED_USER_ID = "demo_user"
 
 dynamodb = boto3.resource("dynamodb", region_name=AWS_REGION)
 dynamo_table = dynamodb.Table(DYNAMO_TABLE)
+dynamo_outbox = DynamoOutbox(dynamo_table, SessionLocal)
 
 def get_granite_stress_score(text: str):
     prompt = f"""
@@ -53,16 +49,9 @@ def get_granite_stress_score(text: str):
     </risk_evaluation>
     """
     try:
-        response = guardian_model.generate(prompt)
-        result = response["results"][0]["generated_text"]
-
-        harm = re.search(r"<harm>(.*?)</harm>", result)
-        confidence = re.search(r"<confidence>(.*?)</confidence>", result)
-        comment = re.search(r"<comment>(.*?)</comment>", result)
-
-        harm_val = harm.group(1).strip() if harm else "Unknown"
-        score_val = float(confidence.group(1).strip()) if confidence else 0.0
-        comment_val = comment.group(1).strip() if comment else "Not provided"
+        # Journal saves that overlap share list-prompt calls to Granite
+        harm_val, confidence_str, comment_val = get_granite_batcher().evaluate_risk(prompt)
+        score_val = float(confidence_str) if confidence_str != "Unknown" else 0.0
 
         return {
             "risk_detected": harm_val,
@@ -78,38 +67,36 @@ def get_granite_stress_score(text: str):
         }
 
 
-def convert_floats_to_decimal(obj):
-    if isinstance(obj, float):
-        return Decimal(str(obj))
-    elif isinstance(obj, list):
-        return [convert_floats_to_decimal(i) for i in obj]
-    elif isinstance(obj, dict):
-        return {k: convert_floats_to_decimal(v) for k, v in obj.items()}
-    else:
-        return obj
-
-def save_to_dynamodb(item: dict):
+def queue_dynamodb_mirror(db: Session, item: dict):
+    # Mirrored asynchronously by the outbox flusher once `db` commits
     item["user_id"] = FIXED_USER_ID
-    item = convert_floats_to_decimal(item)
-    try:
-        dynamo_table.put_item(Item=item)
-    except Exception as e:
-        print(f"❌ DynamoDB Upload Error (id={item.get('id')}):", e)
+    dynamo_outbox.enqueue(db, item)
 
 
-HF_API_TOKEN = os.getenv("HF_API_TOKEN")
-if HF_API_TOKEN is None:
-    raise RuntimeError("HF_API_TOKEN not found. Check your .env file.")
+# Word labels never change for a given model, so they are shared across entries
+word_emotion_cache = WordEmotionCache(emotion_cache_model_id())
 
-HUGGINGFACE_API_URL = "https://api-inference.huggingface.co/models/j-hartmann/emotion-english-distilroberta-base"
-HEADERS = {
-    "Authorization": f"Bearer {HF_API_TOKEN}",
-}
+# Edits that change less than this fraction of the text keep the previous
+# full-text emotion and Granite scores instead of re-scoring the whole entry
+JOURNAL_RESCORE_THRESHOLD = float(os.getenv("JOURNAL_RESCORE_THRESHOLD", "0.15"))
+
+# Shared pool for the concurrent scoring stages of journal creation
+analysis_pool = ThreadPoolExecutor(
+    max_workers=int(os.getenv("JOURNAL_ANALYSIS_WORKERS", "8")),
+    thread_name_prefix="journal-analysis"
+)
+
+# Page size used when streaming /journal-entries as NDJSON
+JOURNAL_PAGE_SIZE = int(os.getenv("JOURNAL_PAGE_SIZE", "100"))
 
-# Initialize DB and app
-models.Base.metadata.create_all(bind=engine)
 router = APIRouter()
 
+# Registered before the other startup hooks, which all need the tables
+@router.on_event("startup")
+def create_journal_tables():
+    models.Base.metadata.create_all(bind=engine)
+    ensure_packed_column(engine)
+
 # Pydantic models
 class AllEmotionScore(BaseModel):
     emotion: str
@@ -150,20 +137,20 @@ def get_db():
     finally:
         db.close()
 
-# Emotion analysis via Hugging Face API
+# Emotion analysis via the configured backend (Hugging Face API by default, see emotion_backends)
 def call_emotion_api(text: str):
+    return call_emotion_api_batch([text])[0]
+
+def call_emotion_api_batch(texts: List[str]):
+    # One call for many inputs; the backend answers with one result list per input
     try:
-        response = requests.post(
-            HUGGINGFACE_API_URL,
-            headers=HEADERS,
-            json={"inputs": text}
-        )
-        response.raise_for_status()
-        return response.json()[0]
+        return get_emotion_backend().classify(texts)
     except requests.exceptions.RequestException as e:
         raise HTTPException(status_code=500, detail=f"Emotion API call failed: {str(e)}")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Emotion analysis failed: {str(e)}")
 
-def analyze_emotions(text: str):
+def analyze_full_text(text: str):
     full_text_results = call_emotion_api(text)
     dominant_emotion = full_text_results[0]['label'].lower()
     dominant_score = round(full_text_results[0]['score'], 3)
@@ -171,32 +158,86 @@ def analyze_emotions(text: str):
         {"emotion": res['label'].lower(), "score": round(res['score'], 3)}
         for res in full_text_results
     ]
+    return dominant_emotion, dominant_score, all_emotions
 
-    words = text.split()
+def analyze_word_emotions(words: List[str]):
     word_emotions = []
-    for word in words:
-        word_result = call_emotion_api(word)
+    for word, word_result in zip(words, classify_words(words, call_emotion_api_batch, cache=word_emotion_cache)):
         result = word_result[0]
         word_emotions.append({
             "text": word,
             "emotion": result['label'].lower(),
             "score": round(result['score'], 3)
         })
+    return word_emotions
 
+def analyze_emotions(text: str):
+    dominant_emotion, dominant_score, all_emotions = analyze_full_text(text)
+    word_emotions = analyze_word_emotions(text.split())
     return dominant_emotion, dominant_score, all_emotions, word_emotions
 
+def _timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+def run_analysis_pipeline(text: str):
+    """Run the three remote scoring calls for `text` concurrently.
+
+    Returns ({stage: result}, {stage: seconds}) for the "full_text", "words"
+    and "granite" stages; wall time is roughly that of the slowest stage.
+    """
+    futures = {
+        "full_text": analysis_pool.submit(_timed, analyze_full_text, text),
+        "words": analysis_pool.submit(_timed, analyze_word_emotions, text.split()),
+        "granite": analysis_pool.submit(_timed, get_granite_stress_score, text),
+    }
+    results, timings = {}, {}
+    for stage, future in futures.items():
+        results[stage], timings[stage] = future.result()
+    return results, timings
+
+def format_server_timing(timings: dict) -> str:
+    return ", ".join(f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in timings.items())
+
+def reanalyze_edited_words(old_word_emotions, new_words: List[str]):
+    """Token-level diff of an edit: reuse results of unchanged words, classify the rest.
+
+    Returns the word emotions for `new_words` and the fraction of the text
+    that changed (0.0 = identical, 1.0 = fully rewritten).
+    """
+    old_words = [word['text'] for word in old_word_emotions]
+    matcher = difflib.SequenceMatcher(a=old_words, b=new_words, autojunk=False)
+
+    word_emotions = [None] * len(new_words)
+    changed_positions = []
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            for old_word, position in zip(old_word_emotions[i1:i2], range(j1, j2)):
+                word_emotions[position] = old_word
+        else:
+            changed_positions.extend(range(j1, j2))
+
+    changed_words = [new_words[position] for position in changed_positions]
+    for position, word_emotion in zip(changed_positions, analyze_word_emotions(changed_words)):
+        word_emotions[position] = word_emotion
+
+    change_ratio = 1.0 - matcher.ratio()
+    return word_emotions, change_ratio
+
 # Routes
 @router.post("/journal-entry", response_model=JournalEntryResponse)
-def create_journal_entry(entry: JournalRequest, db: Session = Depends(get_db)):
+def create_journal_entry(entry: JournalRequest, response: Response, db: Session = Depends(get_db)):
+    request_start = time.perf_counter()
     existing = db.query(models.JournalEntry).filter(models.JournalEntry.date == entry.date).first()
     if existing:
         raise HTTPException(status_code=400, detail="Journal entry for this date already exists")
 
-    # Emotion analysis
-    dominant_emotion, dominant_score, all_emotions, word_emotions_data = analyze_emotions(entry.text)
-
-    # Granite risk score
-    granite_result = get_granite_stress_score(entry.text)
+    # Full-text emotion, word emotions and Granite risk score run concurrently
+    results, timings = run_analysis_pipeline(entry.text)
+    dominant_emotion, dominant_score, all_emotions = results["full_text"]
+    word_emotions_data = results["words"]
+    granite_result = results["granite"]
     stress_score = granite_result["stress_score"]
     risk_detected = granite_result["risk_detected"]
     risk_comment = granite_result["risk_comment"]
@@ -209,25 +250,18 @@ def create_journal_entry(entry: JournalRequest, db: Session = Depends(get_db)):
         date=entry.date,
         dominant_emotion=dominant_emotion,
         dominant_score=dominant_score,
-        all_emotions=all_emotions
+        all_emotions=all_emotions,
+        word_emotions_packed=pack_word_emotions(entry.text, word_emotions_data)
     )
-    for word in word_emotions_data:
-        journal.word_emotions.append(models.WordEmotion(
-            id=str(uuid4()),
-            text=word['text'],
-            emotion=word['emotion'],
-            score=word['score']
-        ))
 
+    # Journal row and its DynamoDB mirror item commit together
+    stage_start = time.perf_counter()
     db.add(journal)
-    db.commit()
-    db.refresh(journal)
-
-    # Save full data to DynamoDB
-    save_to_dynamodb({
-        "id": journal.id,
-        "text": journal.text,
-        "date": journal.date.isoformat(),
+    record_journal_scores(db, entry.date, dominant_emotion, dominant_score, stress_score)
+    queue_dynamodb_mirror(db, {
+        "id": journal_id,
+        "text": entry.text,
+        "date": entry.date.isoformat(),
         "dominant_emotion": dominant_emotion,
         "dominant_score": dominant_score,
         "stress_score": stress_score,
@@ -236,6 +270,13 @@ def create_journal_entry(entry: JournalRequest, db: Session = Depends(get_db)):
         "all_emotions": all_emotions,
         "word_emotions": word_emotions_data
     })
+    db.commit()
+    db.refresh(journal)
+    timings["db"] = time.perf_counter() - stage_start
+    dynamo_outbox.notify()
+
+    timings["total"] = time.perf_counter() - request_start
+    response.headers["Server-Timing"] = format_server_timing(timings)
 
     return {
         "id": journal.id,
@@ -255,27 +296,30 @@ def update_journal_entry(entry_id: str, request: JournalEditRequest, db: Session
     if not journal:
         raise HTTPException(status_code=404, detail="Journal entry not found")
 
-    db.query(models.WordEmotion).filter(models.WordEmotion.journal_id == journal.id).delete()
+    word_emotions_data, change_ratio = reanalyze_edited_words(journal_word_emotions(journal), request.text.split())
+
+    granite_result = None
+    if change_ratio >= JOURNAL_RESCORE_THRESHOLD or not journal.all_emotions:
+        dominant_emotion, dominant_score, all_emotions = analyze_full_text(request.text)
+        granite_result = get_granite_stress_score(request.text)
+    else:
+        dominant_emotion = journal.dominant_emotion
+        dominant_score = journal.dominant_score or 0.0
+        all_emotions = journal.all_emotions
 
-    dominant_emotion, dominant_score, all_emotions, word_emotions_data = analyze_emotions(request.text)
     journal.text = request.text
     journal.dominant_emotion = dominant_emotion
     journal.dominant_score = dominant_score
     journal.all_emotions = all_emotions
-    journal.word_emotions = []
-
-    for word in word_emotions_data:
-        journal.word_emotions.append(models.WordEmotion(
-            id=str(uuid4()),
-            text=word['text'],
-            emotion=word['emotion'],
-            score=word['score']
-        ))
 
-    db.commit()
-    db.refresh(journal)
+    journal.word_emotions_packed = pack_word_emotions(request.text, word_emotions_data)
+    journal.word_emotions = []  # drop legacy rows, if any
+    record_journal_scores(
+        db, journal.date, dominant_emotion, dominant_score,
+        granite_result["stress_score"] if granite_result else None
+    )
 
-    save_to_dynamodb({
+    dynamo_item = {
         "id": journal.id,
         "text": journal.text,
         "date": journal.date.isoformat(),
@@ -283,7 +327,18 @@ def update_journal_entry(entry_id: str, request: JournalEditRequest, db: Session
         "dominant_score": dominant_score,
         "all_emotions": all_emotions,
         "word_emotions": word_emotions_data
-    })
+    }
+    if granite_result:
+        dynamo_item.update({
+            "stress_score": granite_result["stress_score"],
+            "risk_detected": granite_result["risk_detected"],
+            "risk_comment": granite_result["risk_comment"]
+        })
+    queue_dynamodb_mirror(db, dynamo_item)
+
+    db.commit()
+    db.refresh(journal)
+    dynamo_outbox.notify()
 
     return {
         "id": journal.id,
@@ -306,6 +361,46 @@ def get_journal_by_date(date_str: str = Query(...), db: Session = Depends(get_db
     if not journal:
         raise HTTPException(status_code=404, detail="No journal entry found for this date")
 
+    return serialize_journal(journal)
+
+@router.get("/journal-emotion-cache/stats")
+def get_emotion_cache_stats():
+    return word_emotion_cache.stats()
+
+def encode_journal_cursor(journal) -> str:
+    return f"{journal.date.isoformat()}|{journal.id}"
+
+def decode_journal_cursor(cursor: str):
+    try:
+        date_part, journal_id = cursor.split("|", 1)
+        return datetime.strptime(date_part, "%Y-%m-%d").date(), journal_id
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor.")
+
+def fetch_journal_page(db: Session, after=None, limit: Optional[int] = None, include_words: bool = True):
+    # Keyset pagination on (date, id) with word emotions loaded in one extra query
+    query = db.query(models.JournalEntry)
+    if include_words:
+        # Only legacy entries have rows here; packed entries come back empty
+        query = query.options(selectinload(models.JournalEntry.word_emotions))
+    if after:
+        after_date, after_id = after
+        query = query.filter(or_(
+            models.JournalEntry.date > after_date,
+            and_(models.JournalEntry.date == after_date, models.JournalEntry.id > after_id)
+        ))
+    query = query.order_by(models.JournalEntry.date, models.JournalEntry.id)
+    if limit:
+        query = query.limit(limit)
+    return query.all()
+
+def journal_word_emotions(journal):
+    if journal.word_emotions_packed is not None:
+        return unpack_word_emotions(journal.text, journal.word_emotions_packed)
+    # Entries not migrated by migrate_word_emotions still use one row per word
+    return [{"text": w.text, "emotion": w.emotion, "score": w.score} for w in journal.word_emotions]
+
+def serialize_journal(journal, include_words: bool = True):
     return {
         "id": journal.id,
         "text": journal.text,
@@ -313,32 +408,78 @@ def get_journal_by_date(date_str: str = Query(...), db: Session = Depends(get_db
         "dominant_emotion": journal.dominant_emotion,
         "dominant_score": journal.dominant_score or 0.0,
         "all_emotions": journal.all_emotions or [],
-        "word_emotions": [
-            {"text": w.text, "emotion": w.emotion, "score": w.score}
-            for w in journal.word_emotions
-        ]
+        "word_emotions": journal_word_emotions(journal) if include_words else []
     }
 
+def stream_journals_ndjson(after, include_words: bool):
+    # Own session, one page in memory at a time, regardless of total history size
+    db = SessionLocal()
+    try:
+        while True:
+            page = fetch_journal_page(db, after, JOURNAL_PAGE_SIZE, include_words)
+            for journal in page:
+                item = serialize_journal(journal, include_words)
+                item["date"] = journal.date.isoformat()
+                yield json.dumps(item) + "\n"
+            if len(page) < JOURNAL_PAGE_SIZE:
+                break
+            after = (page[-1].date, page[-1].id)
+            db.expunge_all()
+    finally:
+        db.close()
+
+@router.get("/journal-outbox/stats")
+def get_outbox_stats():
+    return dynamo_outbox.stats()
+
+@router.get("/journal-analytics")
+def get_journal_analytics(
+    start: date,
+    end: date,
+    period: str = "day",
+    window: int = Query(7, ge=1, le=365),
+    db: Session = Depends(get_db)
+):
+    if period not in PERIODS:
+        raise HTTPException(status_code=400, detail=f"period must be one of {', '.join(PERIODS)}")
+    if end < start or (end - start).days > 3660:
+        raise HTTPException(status_code=400, detail="Invalid date range.")
+    return emotion_timeseries(db, start, end, period, window)
+
+@router.on_event("startup")
+def start_dynamo_outbox():
+    dynamo_outbox.start()
+
+@router.on_event("startup")
+def backfill_emotion_aggregates():
+    # One-off: entries written before the aggregate table existed
+    db = SessionLocal()
+    try:
+        if db.query(models.EmotionAggregate).first() is None and db.query(models.JournalEntry).first() is not None:
+            rebuild_emotion_aggregates(db)
+    finally:
+        db.close()
+
+@router.on_event("shutdown")
+def stop_dynamo_outbox():
+    dynamo_outbox.stop()
+
 @router.get("/journal-entries", response_model=List[JournalEntryResponse])
-def get_all_journals(db: Session = Depends(get_db)):
-    journals = db.query(models.JournalEntry).all()
-    response = []
-    for j in journals:
-        entry = JournalEntryResponse(
-            id=j.id,
-            text=j.text,
-            date=j.date,
-            dominant_emotion=j.dominant_emotion,
-            dominant_score=j.dominant_score or 0.0,
-            all_emotions=j.all_emotions or [],
-            word_emotions=[
-                WordEmotionOut(
-                    text=w.text,
-                    emotion=w.emotion,
-                    score=w.score
-                )
-                for w in j.word_emotions
-            ]
-        )
-        response.append(entry)
-    return response
+def get_all_journals(
+    response: Response,
+    limit: int = Query(JOURNAL_PAGE_SIZE, ge=1, le=500),
+    cursor: Optional[str] = None,
+    include_words: bool = True,
+    stream: bool = False,
+    db: Session = Depends(get_db)
+):
+    after = decode_journal_cursor(cursor) if cursor else None
+
+    if stream:
+        return StreamingResponse(stream_journals_ndjson(after, include_words), media_type="application/x-ndjson")
+
+    # Always one page; the next one is at X-Next-Cursor
+    journals = fetch_journal_page(db, after, limit, include_words)
+    if len(journals) == limit:
+        response.headers["X-Next-Cursor"] = encode_journal_cursor(journals[-1])
+    return [serialize_journal(j, include_words) for j in journals]
@@ -0,0 +1,104 @@
+import os
+import time
+from sqlalchemy import inspect, text
+from sqlalchemy.orm import selectinload
+from .database import engine, SessionLocal
+from . import models
+from .word_emotion_codec import pack_word_emotions, unpack_word_emotions
+
+# Migration from one WordEmotion row per token to the packed
+# journal_entries.word_emotions_packed blob.
+# Run with: python -m backend.migrate_word_emotions
+
+
+def ensure_packed_column(bind=engine):
+    # create_all() does not add columns to existing tables
+    columns = {column["name"] for column in inspect(bind).get_columns("journal_entries")}
+    if "word_emotions_packed" not in columns:
+        column_type = models.JournalEntry.__table__.c.word_emotions_packed.type.compile(dialect=bind.dialect)
+        with bind.begin() as conn:
+            conn.execute(text(f"ALTER TABLE journal_entries ADD COLUMN word_emotions_packed {column_type}"))
+
+
+def migrate_word_emotions(session_factory=SessionLocal, batch_size: int = 100):
+    """Pack legacy rows of every entry that has no blob yet.
+
+    Entries whose rows no longer line up with the tokens of their text are
+    left on the legacy rows, which are still served as before.
+    Returns (migrated, skipped).
+    """
+    migrated = skipped = 0
+    db = session_factory()
+    try:
+        last_id = ""
+        while True:
+            journals = (
+                db.query(models.JournalEntry)
+                .options(selectinload(models.JournalEntry.word_emotions))
+                .filter(models.JournalEntry.word_emotions_packed.is_(None), models.JournalEntry.id > last_id)
+                .order_by(models.JournalEntry.id)
+                .limit(batch_size)
+                .all()
+            )
+            if not journals:
+                break
+            for journal in journals:
+                words = [{"text": w.text, "emotion": w.emotion, "score": w.score} for w in journal.word_emotions]
+                try:
+                    journal.word_emotions_packed = pack_word_emotions(journal.text, words)
+                except ValueError as e:
+                    print(f"⚠️ Skipping journal {journal.id}: {e}")
+                    skipped += 1
+                    continue
+                journal.word_emotions = []
+                migrated += 1
+            last_id = journals[-1].id
+            db.commit()
+            db.expunge_all()
+    finally:
+        db.close()
+    return migrated, skipped
+
+
+def _database_size(bind=engine):
+    with bind.connect() as conn:
+        page_count = conn.execute(text("PRAGMA page_count")).scalar()
+        page_size = conn.execute(text("PRAGMA page_size")).scalar()
+    return page_count * page_size
+
+
+def _time_word_loads(use_packed: bool):
+    db = SessionLocal()
+    try:
+        start = time.perf_counter()
+        for journal_id, journal_date in db.query(models.JournalEntry.id, models.JournalEntry.date).all():
+            # Same access pattern as get_journal_by_date
+            journal = db.query(models.JournalEntry).filter(models.JournalEntry.date == journal_date).first()
+            if use_packed and journal.word_emotions_packed is not None:
+                unpack_word_emotions(journal.text, journal.word_emotions_packed)
+            else:
+                [{"text": w.text, "emotion": w.emotion, "score": w.score} for w in journal.word_emotions]
+            db.expunge_all()
+        return time.perf_counter() - start
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    ensure_packed_column()
+    models.Base.metadata.create_all(bind=engine)
+
+    is_sqlite = engine.dialect.name == "sqlite"
+    size_before = _database_size() if is_sqlite else None
+    load_before = _time_word_loads(use_packed=False)
+
+    migrated, skipped = migrate_word_emotions()
+    print(f"✅ Packed {migrated} journal entries ({skipped} left on legacy rows)")
+
+    load_after = _time_word_loads(use_packed=True)
+    print(f"⏱️ word emotion load for all entries: {load_before * 1000:.1f}ms → {load_after * 1000:.1f}ms")
+
+    if is_sqlite and os.getenv("MIGRATE_VACUUM", "1") == "1":
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            conn.execute(text("VACUUM"))
+        print(f"🗜️ database size: {size_before / 1024:.0f} KiB → {_database_size() / 1024:.0f} KiB")
@@ -0,0 +1,126 @@
+import asyncio
+import os
+import threading
+import json
+import time
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+# Local stand-in for the Colab RAG server, for load tests of the /chat path.
+# Run the load test with: python -m backend.mock_rag_server
+
+MOCK_RAG_LATENCY = float(os.getenv("MOCK_RAG_LATENCY", "0.05"))
+MOCK_RAG_PORT = int(os.getenv("MOCK_RAG_PORT", "8765"))
+MOCK_RAG_TOKEN_DELAY = float(os.getenv("MOCK_RAG_TOKEN_DELAY", "0.02"))
+MOCK_RAG_ANSWER = "I hear you. Exams can feel like a lot. Let's take one slow breath together, then pick the smallest next step."
+
+app = FastAPI()
+stats = {"requests": 0}
+settings = {"simulate_generation": False, "error_status": None, "error_delay": 0.0}
+
+
+async def _simulated_outage():
+    # An unhealthy upstream: slow to answer, then an error status
+    await asyncio.sleep(settings["error_delay"])
+    return JSONResponse({"detail": "upstream unavailable"}, status_code=settings["error_status"])
+
+
+async def _sse_tokens():
+    for word in MOCK_RAG_ANSWER.split(" "):
+        await asyncio.sleep(MOCK_RAG_TOKEN_DELAY)
+        yield f"data: {json.dumps({'token': word + ' '})}\n\n"
+    yield "data: [DONE]\n\n"
+
+
+@app.post("/query")
+async def query(request: Request):
+    body = await request.json()
+    stats["requests"] += 1
+    if settings["error_status"]:
+        return await _simulated_outage()
+    await asyncio.sleep(MOCK_RAG_LATENCY)
+    if body.get("stream"):
+        return StreamingResponse(_sse_tokens(), media_type="text/event-stream")
+    if settings["simulate_generation"]:
+        # A buffered answer only arrives once every token has been generated
+        await asyncio.sleep(MOCK_RAG_TOKEN_DELAY * len(MOCK_RAG_ANSWER.split(" ")))
+    return {"answer": MOCK_RAG_ANSWER}
+
+
+@app.post("/chat")
+async def chat(request: Request):
+    body = await request.json()
+    stats["requests"] += 1
+    if settings["error_status"]:
+        return await _simulated_outage()
+    await asyncio.sleep(MOCK_RAG_LATENCY)
+    return {"response": MOCK_RAG_ANSWER}
+
+
+def serve_in_background(port: int = MOCK_RAG_PORT):
+    import uvicorn
+
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+
+if __name__ == "__main__":
+    import httpx
+    from .rag_client import RagClient
+
+    CONCURRENCY = 50
+    ROUNDS = 10
+    base_url = f"http://127.0.0.1:{MOCK_RAG_PORT}"
+    server = serve_in_background()
+
+    async def per_request_client():
+        # What /chat used to do: a fresh client (and connection) per message
+        async with httpx.AsyncClient() as client:
+            response = await client.post(f"{base_url}/query", json={"query": "I feel stressed about exams"})
+            response.raise_for_status()
+
+    async def shared_client(rag):
+        response = await rag.post_prompt("I feel stressed about exams")
+        response.raise_for_status()
+
+    async def run(label, make_call):
+        latencies = []
+
+        async def timed():
+            start = time.perf_counter()
+            await make_call()
+            latencies.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        for _ in range(ROUNDS):
+            await asyncio.gather(*(timed() for _ in range(CONCURRENCY)))
+        elapsed = time.perf_counter() - start
+        latencies.sort()
+        p50 = latencies[len(latencies) // 2] * 1000
+        p99 = latencies[int(len(latencies) * 0.99) - 1] * 1000
+        print(f"📊 {label:>18}: {len(latencies) / elapsed:.0f} req/s, p50 {p50:.1f}ms, p99 {p99:.1f}ms")
+
+    async def main():
+        await run("per-request client", per_request_client)
+        rag = RagClient(base_url)
+        await run("shared client", lambda: shared_client(rag))
+
+        # Time to first byte: buffered answer vs relayed token stream
+        settings["simulate_generation"] = True
+        start = time.perf_counter()
+        await rag.post_prompt("I feel stressed about exams")
+        buffered = time.perf_counter() - start
+        start = time.perf_counter()
+        stream = rag.stream_prompt("I feel stressed about exams")
+        await stream.__anext__()
+        first_token = time.perf_counter() - start
+        await stream.aclose()
+        print(f"⏱️ time to first byte: buffered {buffered * 1000:.0f}ms, streamed {first_token * 1000:.0f}ms")
+        await rag.aclose()
+
+    asyncio.run(main())
+    server.should_exit = True
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Date, Float, Text, ForeignKey
+from sqlalchemy import Column, String, Date, Float, Text, ForeignKey, Integer, LargeBinary, Boolean
 from sqlalchemy.orm import relationship
 from sqlalchemy.dialects.sqlite import JSON
 from .database import Base
@@ -12,6 +12,8 @@ class JournalEntry(Base):
     dominant_emotion = Column(String)
     dominant_score = Column(Float)
     all_emotions = Column(JSON)
+    # Packed per-token emotions (see word_emotion_codec); replaces WordEmotion rows
+    word_emotions_packed = Column(LargeBinary)
 
     # ✅ Define relationship to WordEmotion
     word_emotions = relationship("WordEmotion", back_populates="journal", cascade="all, delete-orphan")
@@ -30,3 +32,78 @@ class WordEmotion(Base):
 
     # ✅ Back-reference to parent journal
     journal = relationship("JournalEntry", back_populates="word_emotions")
+
+
+class DynamoOutbox(Base):
+    __tablename__ = "dynamo_outbox"
+
+    # Pending DynamoDB mirror writes, committed in the same transaction as the journal change
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    item_id = Column(String, index=True)
+    payload = Column(Text)
+    attempts = Column(Integer, default=0)
+    next_attempt_at = Column(Float, default=0.0, index=True)
+    created_at = Column(Float)
+    last_error = Column(Text)
+
+
+class DynamoOutboxDeadLetter(Base):
+    __tablename__ = "dynamo_outbox_dead_letters"
+
+    # Outbox rows that kept failing after OUTBOX_MAX_ATTEMPTS, kept for inspection and replay
+    id = Column(Integer, primary_key=True)  # id of the original outbox row
+    item_id = Column(String, index=True)
+    payload = Column(Text)
+    attempts = Column(Integer)
+    created_at = Column(Float)
+    failed_at = Column(Float)
+    last_error = Column(Text)
+
+
+class EmotionAggregate(Base):
+    __tablename__ = "emotion_aggregates"
+
+    # One row per day and per ISO week (period_start = Monday), kept up to date on journal writes
+    period = Column(String, primary_key=True)
+    period_start = Column(Date, primary_key=True)
+    entry_count = Column(Integer, default=0)
+    emotion_counts = Column(JSON)
+    dominant_score_sum = Column(Float, default=0.0)
+    stress_score_sum = Column(Float, default=0.0)
+    stress_count = Column(Integer, default=0)
+
+
+class TweetMonitorState(Base):
+    __tablename__ = "tweet_monitor_state"
+
+    # One row per monitored Twitter handle, shared by every worker process running checks
+    username = Column(String, primary_key=True)
+    shard_key = Column(Integer, index=True)
+    interval_seconds = Column(Float)
+    next_check_at = Column(Float, index=True)
+    last_checked = Column(Float)
+    last_risk = Column(Float, default=0.0)
+    show_popup = Column(Boolean, default=False)
+    support_message = Column(Text)
+    risky_tweet_text = Column(Text)
+    consecutive_failures = Column(Integer, default=0)
+    # Newest tweet id seen; the next poll only asks Twitter for tweets after it
+    since_id = Column(String)
+    popup_expires_at = Column(Float)  # a risky tweet's popup lasts 24h from when it was posted
+
+
+class AnalyzedTweet(Base):
+    __tablename__ = "analyzed_tweets"
+
+    # Local set of tweet ids already in TweetRiskAnalysis, so polls skip them without a DynamoDB read
+    tweet_id = Column(String, primary_key=True)
+    analyzed_at = Column(Float)
+
+
+class TwitterUser(Base):
+    __tablename__ = "twitter_users"
+
+    # Cached username -> numeric user id resolution; user_id is NULL for handles Twitter doesn't know
+    username = Column(String, primary_key=True)
+    user_id = Column(String)
+    resolved_at = Column(Float)
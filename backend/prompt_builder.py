@@ -0,0 +1,164 @@
+import os
+import re
+import threading
+import time
+from functools import lru_cache
+
+# Prompt assembly for /chat.
+# The static fragments (system prompt, tone scaffolding) are built once at
+# import; each turn only joins them with the user's message and as much recent
+# history as fits the token budget, so prompts stay small and never overflow
+# the upstream model's context window.
+
+# Base prompt
+BASE_PROMPT = """
+You are Lumi, a compassionate mental health support assistant. You help users who are feeling stressed, anxious, or overwhelmed.
+You are not a medical professional and never offer clinical advice or diagnosis.
+Always encourage users to reach out to licensed therapists or mental health hotlines if they are in crisis.
+Keep your responses warm, empathetic, and supportive. Keep the responses concise and to the point preferrably not more than 2 sentences.
+"""
+
+PROMPT_TOKENIZER = os.getenv("PROMPT_TOKENIZER", "gpt2")  # Hugging Face fast tokenizer for counting
+PROMPT_CONTEXT_TOKENS = int(os.getenv("PROMPT_CONTEXT_TOKENS", "2048"))
+PROMPT_REPLY_TOKENS = int(os.getenv("PROMPT_REPLY_TOKENS", "256"))  # kept free for the generated reply
+PROMPT_HISTORY_TURNS = int(os.getenv("PROMPT_HISTORY_TURNS", "6"))
+
+# 🧠 Tone scaffolding, precompiled
+SYSTEM_FRAGMENT = BASE_PROMPT.strip() + "\n\n"
+RISKY_TWEET_CONTEXT = (
+    "⚠️ The user may be at mental health risk based on their recent social media post. "
+    "Respond with high empathy, but don’t be robotic. You may include a grounding exercise, gentle humor, or supportive encouragement if appropriate. "
+    "Feel free to share one actionable tip (like deep breathing, journaling, or a distraction strategy). "
+    "You can nudge them to talk to a mental health professional, but prioritize making them feel safe and understood.\n"
+)
+HIGH_STRESS_CONTEXT = (
+    "🧘 The user seems highly stressed. Speak gently and offer helpful suggestions like relaxation techniques or supportive thoughts.\n"
+)
+EMOTION_CONTEXTS = {
+    emotion: f"The user feels {emotion}. Be affirming and avoid advice overload.\n"
+    for emotion in ("sad", "angry", "fearful")
+}
+USER_PREFIX = "User: "
+
+
+def emotion_context(emotion: str = None, stress: float = None, risky_tweet: bool = False) -> str:
+    if risky_tweet:
+        return RISKY_TWEET_CONTEXT
+    if stress and stress > 0.7:
+        return HIGH_STRESS_CONTEXT
+    return EMOTION_CONTEXTS.get(emotion, "")
+
+
+class TokenCounter:
+    """Counts tokens with a Hugging Face fast tokenizer.
+
+    Falls back to a conservative word/punctuation estimate when the tokenizer
+    can't be loaded (no `tokenizers` package or no network on first use).
+    """
+
+    def __init__(self, name: str = PROMPT_TOKENIZER):
+        self.name = name
+        self._tokenizer = None
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    @property
+    def tokenizer(self):
+        if not self._loaded:
+            with self._lock:
+                if not self._loaded:
+                    try:
+                        from tokenizers import Tokenizer
+                        self._tokenizer = Tokenizer.from_pretrained(self.name)
+                    except Exception as e:
+                        print(f"⚠️ Tokenizer '{self.name}' unavailable ({e}); estimating prompt tokens")
+                    self._loaded = True
+        return self._tokenizer
+
+    def _estimate_spans(self, text: str):
+        # Roughly one BPE token per word or symbol, plus a third for sub-word splits
+        return [m.end() for m in re.finditer(r"\w+|[^\w\s]", text)]
+
+    def count(self, text: str) -> int:
+        if not text:
+            return 0
+        if self.tokenizer is not None:
+            return len(self.tokenizer.encode(text, add_special_tokens=False).ids)
+        return (len(self._estimate_spans(text)) * 4 + 2) // 3
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        """The longest prefix of `text` that fits in `max_tokens`."""
+        if max_tokens <= 0:
+            return ""
+        if self.tokenizer is not None:
+            offsets = self.tokenizer.encode(text, add_special_tokens=False).offsets
+            return text if len(offsets) <= max_tokens else text[:offsets[max_tokens - 1][1]]
+        ends = self._estimate_spans(text)
+        keep = max_tokens * 3 // 4
+        return text if len(ends) <= keep else text[:ends[keep - 1]]
+
+
+token_counter = TokenCounter()
+
+
+@lru_cache(maxsize=16)
+def _fragment_tokens(fragment: str) -> int:
+    # Static fragments are counted once per process
+    return token_counter.count(fragment)
+
+
+def build_prompt(user_text: str, context: str = "", history=(), summary: str = "", budget: int = None) -> str:
+    """Assemble the RAG prompt within `budget` tokens.
+
+    `history` is a chronological list of (role, message) turns; the newest
+    turns that fit are kept, then the rolling `summary` of older turns if
+    there is still room. The user's message itself is only truncated when it
+    alone would exceed the budget.
+    """
+    if budget is None:
+        budget = PROMPT_CONTEXT_TOKENS - PROMPT_REPLY_TOKENS
+    remaining = budget - _fragment_tokens(SYSTEM_FRAGMENT) - _fragment_tokens(context) - _fragment_tokens(USER_PREFIX)
+
+    user_tokens = token_counter.count(user_text)
+    if user_tokens > remaining:
+        user_text = token_counter.truncate(user_text, remaining)
+        user_tokens = remaining
+    remaining -= user_tokens
+
+    lines = []
+    for role, message in reversed(list(history)[-PROMPT_HISTORY_TURNS:]):
+        line = f"{role}: {message}\n"
+        cost = token_counter.count(line)
+        if cost > remaining:
+            break
+        lines.append(line)
+        remaining -= cost
+    lines.reverse()
+
+    if summary:
+        summary_line = summary + "\n"
+        if token_counter.count(summary_line) <= remaining:
+            lines.insert(0, summary_line)
+
+    return "".join([SYSTEM_FRAGMENT, context, *lines, USER_PREFIX, user_text])
+
+
+if __name__ == "__main__":
+    # Benchmark: prompt assembly cost and size with a long history
+    history = [("User" if i % 2 == 0 else "Assistant", "I keep thinking about my exams and I can't sleep at night " * 8) for i in range(20)]
+    user_text = "I feel stressed about exams"
+    context = emotion_context("sad")
+    build_prompt(user_text, context, history)  # load the tokenizer before timing
+
+    rounds = 2000
+    start = time.perf_counter()
+    for _ in range(rounds):
+        prompt = build_prompt(user_text, context, history)
+    elapsed = time.perf_counter() - start
+    unbounded = SYSTEM_FRAGMENT + context + "".join(f"{r}: {m}\n" for r, m in history) + USER_PREFIX + user_text
+    print(f"📊 {rounds} prompts in {elapsed * 1000:.0f}ms ({elapsed * 1e6 / rounds:.0f}µs each), tokenizer: "
+          f"{PROMPT_TOKENIZER if token_counter.tokenizer is not None else 'estimate'}")
+    print(f"📏 full history: {token_counter.count(unbounded)} tokens → bounded: {token_counter.count(prompt)} tokens "
+          f"(budget {PROMPT_CONTEXT_TOKENS - PROMPT_REPLY_TOKENS})")
+    tight = build_prompt(user_text, context, history, budget=300)
+    print(f"📏 budget 300: {token_counter.count(tight)} tokens, {tight.count(chr(10) + 'User: ') + tight.count(chr(10) + 'Assistant: ')} history turns kept")
@@ -0,0 +1,251 @@
+import asyncio
+import os
+import time
+from contextlib import asynccontextmanager
+from .rag_client import RagServerError
+
+# Admission control in front of the upstream RAG server.
+# The Colab/ngrok backend only copes with a few generations at once, so:
+#   - at most RAG_MAX_INFLIGHT upstream calls run at a time; others queue,
+#     and give up after RAG_QUEUE_TIMEOUT instead of holding a worker
+#   - identical prompts already in flight share the one upstream call
+#   - after RAG_BREAKER_FAILURES consecutive failures the circuit opens and
+#     callers get the fallback reply immediately for RAG_BREAKER_COOLDOWN
+#     seconds; then a single probe call decides whether it closes again
+
+RAG_MAX_INFLIGHT = int(os.getenv("RAG_MAX_INFLIGHT", "4"))
+RAG_MAX_QUEUE = int(os.getenv("RAG_MAX_QUEUE", "32"))
+RAG_QUEUE_TIMEOUT = float(os.getenv("RAG_QUEUE_TIMEOUT", "10"))
+RAG_BREAKER_FAILURES = int(os.getenv("RAG_BREAKER_FAILURES", "5"))
+RAG_BREAKER_COOLDOWN = float(os.getenv("RAG_BREAKER_COOLDOWN", "30"))
+
+
+class RagUnavailable(Exception):
+    """The call was not sent upstream (circuit open, queue full or queue deadline passed)."""
+
+    def __init__(self, reason: str):
+        super().__init__(f"RAG server unavailable: {reason}")
+        self.reason = reason
+
+
+def _is_upstream_failure(exc: Exception) -> bool:
+    # A 4xx is our request's fault, not a sign the server is unhealthy
+    return not (isinstance(exc, RagServerError) and exc.status_code < 500)
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold: int = RAG_BREAKER_FAILURES, cooldown: float = RAG_BREAKER_COOLDOWN):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at < self.cooldown:
+            return "open"
+        return "half-open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half-open" and not self._probing:
+            self._probing = True  # exactly one probe call while half-open
+            return True
+        return False
+
+    def release_probe(self):
+        # The probe ended without an answer (cancelled): let the next call probe instead
+        self._probing = False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+
+    def record_failure(self):
+        self.failures += 1
+        self._probing = False
+        if self.opened_at is not None or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+
+
+class RagAdmission:
+    def __init__(self, max_inflight: int = RAG_MAX_INFLIGHT, max_queue: int = RAG_MAX_QUEUE,
+                 queue_timeout: float = RAG_QUEUE_TIMEOUT, breaker: CircuitBreaker = None):
+        self.max_inflight = max_inflight
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.breaker = breaker or CircuitBreaker()
+        self._semaphore = asyncio.Semaphore(max_inflight)
+        self._inflight = {}  # prompt -> future shared by identical callers
+        self.active = 0
+        self.queued = 0
+        self.counters = {"upstream_calls": 0, "coalesced": 0, "rejected_open": 0,
+                         "rejected_queue_full": 0, "queue_timeouts": 0, "failures": 0}
+
+    @asynccontextmanager
+    async def slot(self):
+        """Hold one upstream slot; raises RagUnavailable instead of waiting forever."""
+        if self.breaker.state == "open":
+            self.counters["rejected_open"] += 1
+            raise RagUnavailable("circuit open")
+        if self._semaphore.locked() and self.queued >= self.max_queue:
+            self.counters["rejected_queue_full"] += 1
+            raise RagUnavailable("queue full")
+
+        self.queued += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.counters["queue_timeouts"] += 1
+            raise RagUnavailable("queue deadline exceeded")
+        finally:
+            self.queued -= 1
+
+        # The circuit may have opened while this call was queued
+        probe = self.breaker.state == "half-open"
+        if not self.breaker.allow():
+            self._semaphore.release()
+            self.counters["rejected_open"] += 1
+            raise RagUnavailable("circuit open")
+
+        self.active += 1
+        self.counters["upstream_calls"] += 1
+        try:
+            yield
+        except Exception as e:
+            if _is_upstream_failure(e):
+                self.counters["failures"] += 1
+                self.breaker.record_failure()
+            else:
+                self.breaker.record_success()
+            raise
+        else:
+            self.breaker.record_success()
+        finally:
+            # CancelledError / GeneratorExit skip both record_* calls above
+            if probe:
+                self.breaker.release_probe()
+            self.active -= 1
+            self._semaphore.release()
+
+    async def run(self, prompt: str, call):
+        """Return `await call(prompt)`, sharing the result with identical in-flight prompts."""
+        future = self._inflight.get(prompt)
+        if future is not None:
+            self.counters["coalesced"] += 1
+            return await asyncio.shield(future)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[prompt] = future
+        try:
+            async with self.slot():
+                result = await call(prompt)
+            future.set_result(result)
+            return result
+        except asyncio.CancelledError:
+            # The leading request went away; callers sharing its call must not be cancelled too
+            future.set_exception(RagUnavailable("coalesced call cancelled"))
+            future.exception()  # mark retrieved when nobody else was waiting
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()
+            raise
+        finally:
+            self._inflight.pop(prompt, None)
+
+    def stats(self):
+        return {
+            "breaker": self.breaker.state,
+            "consecutive_failures": self.breaker.failures,
+            "active": self.active,
+            "queued": self.queued,
+            "coalescing": len(self._inflight),
+            **self.counters
+        }
+
+
+rag_admission = RagAdmission()
+
+
+if __name__ == "__main__":
+    from .mock_rag_server import MOCK_RAG_PORT, serve_in_background, settings, stats
+    from .rag_client import RagClient
+
+    CONCURRENCY = 40
+    server = serve_in_background()
+    rag = RagClient(f"http://127.0.0.1:{MOCK_RAG_PORT}")
+
+    async def fetch(prompt):
+        response = await rag.post_prompt(prompt)
+        if response.status_code != 200:
+            raise RagServerError(response.status_code, response.text)
+        return response.json()["answer"]
+
+    async def burst(label, admission, prompts):
+        stats["requests"] = 0
+        fallbacks = 0
+
+        async def one(prompt):
+            nonlocal fallbacks
+            try:
+                if admission is None:
+                    await fetch(prompt)
+                else:
+                    await admission.run(prompt, fetch)
+            except Exception:
+                fallbacks += 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one(p) for p in prompts))
+        elapsed = time.perf_counter() - start
+        print(f"📊 {label:>22}: {len(prompts)} chats in {elapsed:.2f}s, "
+              f"{stats['requests']} upstream requests, {fallbacks} fallbacks")
+
+    async def main():
+        # Burst of mostly identical prompts (same emotion context and message)
+        prompts = ["User: I feel stressed about exams"] * (CONCURRENCY - 4) + [f"User: question {i}" for i in range(4)]
+        await burst("no admission control", None, prompts)
+        await burst("limit + coalescing", RagAdmission(), prompts)
+
+        # Upstream outage: every call fails after a slow 503
+        settings["error_status"] = 503
+        settings["error_delay"] = 1.0
+        unique = [f"User: message {i}" for i in range(CONCURRENCY)]
+        await burst("outage, no breaker", RagAdmission(breaker=CircuitBreaker(failure_threshold=10 ** 9)), unique)
+        await burst("outage, circuit breaker", RagAdmission(), unique)
+        await rag.aclose()
+
+        # A half-open probe cancelled by a client disconnect must not wedge the breaker
+        admission = RagAdmission(breaker=CircuitBreaker(failure_threshold=1, cooldown=0.05))
+
+        async def failing(prompt):
+            raise RagServerError(503, "down")
+
+        async def hanging(prompt):
+            await asyncio.sleep(3600)
+
+        async def answering(prompt):
+            return "ok"
+
+        try:
+            await admission.run("first", failing)
+        except RagServerError:
+            pass
+        await asyncio.sleep(0.06)
+        probe = asyncio.create_task(admission.run("probe", hanging))
+        await asyncio.sleep(0.01)
+        probe.cancel()
+        await asyncio.gather(probe, return_exceptions=True)
+        result = await admission.run("after", answering)
+        assert result == "ok" and admission.breaker.state == "closed", admission.stats()
+        print(f"✅ cancelled probe released: next call answered, breaker {admission.breaker.state}")
+
+    asyncio.run(main())
+    server.should_exit = True
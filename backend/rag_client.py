@@ -0,0 +1,161 @@
+import json
+import os
+import re
+import httpx
+
+# Shared client for the RAG server (running on Google Colab via Ngrok).
+# One pooled AsyncClient lives for the whole app, so chat turns reuse
+# keep-alive connections instead of paying a TCP+TLS handshake per message.
+
+# IMPORTANT: Update this URL every time you restart the Colab runtime
+RAG_SERVER_URL = os.getenv("RAG_SERVER_URL", "https://braydon-unjudgable-lelia.ngrok-free.dev").rstrip("/")
+RAG_HTTP2 = os.getenv("RAG_HTTP2", "0") == "1"
+RAG_MAX_CONNECTIONS = int(os.getenv("RAG_MAX_CONNECTIONS", "20"))
+RAG_MAX_KEEPALIVE = int(os.getenv("RAG_MAX_KEEPALIVE", "10"))
+RAG_KEEPALIVE_EXPIRY = float(os.getenv("RAG_KEEPALIVE_EXPIRY", "60"))
+
+# Per-phase timeouts: fail fast on connect, stay generous on read for RAG + generation
+RAG_TIMEOUT = httpx.Timeout(
+    connect=float(os.getenv("RAG_CONNECT_TIMEOUT", "5")),
+    read=float(os.getenv("RAG_READ_TIMEOUT", "90")),
+    write=float(os.getenv("RAG_WRITE_TIMEOUT", "10")),
+    pool=float(os.getenv("RAG_POOL_TIMEOUT", "5"))
+)
+
+# Newer servers expose /query with {"query": ...}; older ones /chat with {"question": ...}
+RAG_ENDPOINTS = [("/query", "query"), ("/chat", "question")]
+
+
+# Buffered answers from servers that can't stream are re-sent in chunks of this many words
+RAG_FALLBACK_CHUNK_WORDS = int(os.getenv("RAG_FALLBACK_CHUNK_WORDS", "3"))
+
+
+class RagServerError(Exception):
+    def __init__(self, status_code: int, detail: str = ""):
+        super().__init__(f"RAG server returned {status_code}: {detail[:200]}")
+        self.status_code = status_code
+
+
+def _token_from(data: str) -> str:
+    # Upstream events are JSON objects ({"token": ...} and friends) or raw text
+    try:
+        payload = json.loads(data)
+    except ValueError:
+        return data
+    if isinstance(payload, dict):
+        for key in ("token", "text", "delta", "answer", "response"):
+            if isinstance(payload.get(key), str):
+                return payload[key]
+        return ""
+    return payload if isinstance(payload, str) else ""
+
+
+def chunk_reply(reply: str, words_per_chunk: int = RAG_FALLBACK_CHUNK_WORDS):
+    words = re.findall(r"\S+\s*", reply)
+    for i in range(0, len(words), words_per_chunk):
+        yield "".join(words[i:i + words_per_chunk])
+
+
+def _http2_available():
+    if not RAG_HTTP2:
+        return False
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        print("⚠️ RAG_HTTP2=1 but the 'h2' package is missing (pip install httpx[http2]); using HTTP/1.1")
+        return False
+
+
+class RagClient:
+    def __init__(self, base_url: str = RAG_SERVER_URL):
+        self.base_url = base_url
+        self._client = None
+        self._endpoint = None  # (path, body key) that last answered with something other than 404
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                http2=_http2_available(),
+                timeout=RAG_TIMEOUT,
+                limits=httpx.Limits(
+                    max_connections=RAG_MAX_CONNECTIONS,
+                    max_keepalive_connections=RAG_MAX_KEEPALIVE,
+                    keepalive_expiry=RAG_KEEPALIVE_EXPIRY
+                )
+            )
+        return self._client
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def _endpoint_order(self):
+        if self._endpoint is None:
+            return RAG_ENDPOINTS
+        return [self._endpoint] + [e for e in RAG_ENDPOINTS if e != self._endpoint]
+
+    async def post_prompt(self, prompt: str) -> httpx.Response:
+        """POST `prompt` to the remembered endpoint, falling back on 404."""
+        response = None
+        for path, key in self._endpoint_order():
+            print(f"🚀 Sending request to: {self.base_url}{path}")
+            response = await self.client.post(path, json={key: prompt})
+            if response.status_code == 404:
+                print(f"⚠️ {path} not found, trying next endpoint...")
+                continue
+            self._endpoint = (path, key)
+            return response
+        return response
+
+    async def stream_prompt(self, prompt: str):
+        """Yield reply text pieces as the server produces them.
+
+        SSE and NDJSON responses are relayed token by token; a plain JSON
+        answer (server without streaming) is re-chunked after it arrives.
+        """
+        for path, key in self._endpoint_order():
+            async with self.client.stream(
+                "POST", path,
+                json={key: prompt, "stream": True},
+                headers={"Accept": "text/event-stream, application/x-ndjson, application/json"}
+            ) as response:
+                if response.status_code == 404:
+                    print(f"⚠️ {path} not found, trying next endpoint...")
+                    continue
+                self._endpoint = (path, key)
+                if response.status_code != 200:
+                    await response.aread()
+                    raise RagServerError(response.status_code, response.text)
+
+                content_type = response.headers.get("content-type", "")
+                if "text/event-stream" in content_type:
+                    async for line in response.aiter_lines():
+                        if not line.startswith("data:"):
+                            continue
+                        data = line[5:]
+                        if data.startswith(" "):
+                            data = data[1:]
+                        if data.strip() == "[DONE]":
+                            break
+                        token = _token_from(data)
+                        if token:
+                            yield token
+                elif "ndjson" in content_type:
+                    async for line in response.aiter_lines():
+                        token = _token_from(line) if line.strip() else ""
+                        if token:
+                            yield token
+                else:
+                    data = json.loads(await response.aread())
+                    reply = (data.get("answer") or data.get("response") or "").strip()
+                    for chunk in chunk_reply(reply):
+                        yield chunk
+                return
+        raise RagServerError(404, "no RAG endpoint available")
+
+
+rag_client = RagClient()
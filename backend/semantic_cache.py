@@ -0,0 +1,196 @@
+import os
+import re
+import threading
+import time
+import zlib
+import numpy as np
+
+# Opt-in semantic cache for /chat replies.
+# Prompts are embedded with a small local model and compared (cosine) against
+# the same user's recent prompts; a close enough match returns the stored reply
+# instead of a multi-second RAG + generation round trip.
+# Enable with SEMANTIC_CACHE_ENABLED=1. Embedders (SEMANTIC_CACHE_EMBEDDER):
+#   sentence-transformers  local SentenceTransformer model on CPU (default)
+#   hashing                character n-gram hashing, no model download (benchmarks)
+
+SEMANTIC_CACHE_ENABLED = os.getenv("SEMANTIC_CACHE_ENABLED", "0") == "1"
+SEMANTIC_CACHE_EMBEDDER = os.getenv("SEMANTIC_CACHE_EMBEDDER", "sentence-transformers")
+SEMANTIC_CACHE_MODEL = os.getenv("SEMANTIC_CACHE_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.92"))
+SEMANTIC_CACHE_TTL = float(os.getenv("SEMANTIC_CACHE_TTL", "3600"))
+SEMANTIC_CACHE_MAX_PER_USER = int(os.getenv("SEMANTIC_CACHE_MAX_PER_USER", "200"))
+# Turns at or above this stress score always go to the model
+SEMANTIC_CACHE_MAX_STRESS = float(os.getenv("SEMANTIC_CACHE_MAX_STRESS", "0.7"))
+# Shorter messages ("yes", "ok", "why?") only mean something in context and always go to the model
+SEMANTIC_CACHE_MIN_WORDS = int(os.getenv("SEMANTIC_CACHE_MIN_WORDS", "3"))
+
+
+class SentenceTransformerEmbedder:
+    name = "sentence-transformers"
+
+    def __init__(self, model_id: str = SEMANTIC_CACHE_MODEL):
+        from sentence_transformers import SentenceTransformer
+
+        self.model = SentenceTransformer(model_id, device="cpu")
+
+    def embed(self, text: str) -> np.ndarray:
+        return self.model.encode(text, normalize_embeddings=True).astype(np.float32)
+
+
+class HashingEmbedder:
+    name = "hashing"
+
+    def __init__(self, dim: int = 512, ngram: int = 3):
+        self.dim = dim
+        self.ngram = ngram
+
+    def embed(self, text: str) -> np.ndarray:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        padded = " " + re.sub(r"\s+", " ", text.lower()).strip() + " "
+        for i in range(len(padded) - self.ngram + 1):
+            vector[zlib.crc32(padded[i:i + self.ngram].encode()) % self.dim] += 1.0
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+
+EMBEDDERS = {
+    "sentence-transformers": SentenceTransformerEmbedder,
+    "hashing": HashingEmbedder,
+}
+
+
+def should_bypass(risky_tweet: bool, stress: float = None, user_input: str = None) -> bool:
+    """High-risk turns and context-dependent short replies always get a fresh answer from the model."""
+    if user_input is not None and len(user_input.split()) < SEMANTIC_CACHE_MIN_WORDS:
+        return True
+    return bool(risky_tweet) or (stress is not None and stress >= SEMANTIC_CACHE_MAX_STRESS)
+
+
+class _UserIndex:
+    # Rows of unit vectors; a lookup is one matrix-vector product over this user's entries
+    def __init__(self, dim: int):
+        self.vectors = np.empty((0, dim), dtype=np.float32)
+        self.replies = []
+        self.expires = np.empty(0, dtype=np.float64)
+
+    def prune(self, now: float, max_entries: int):
+        keep = self.expires > now
+        if len(self.replies) - int(keep.sum()) > 0:
+            self.vectors = self.vectors[keep]
+            self.expires = self.expires[keep]
+            self.replies = [r for r, k in zip(self.replies, keep) if k]
+        if len(self.replies) > max_entries:
+            drop = len(self.replies) - max_entries  # oldest entries go first
+            self.vectors = self.vectors[drop:]
+            self.expires = self.expires[drop:]
+            self.replies = self.replies[drop:]
+
+
+class SemanticResponseCache:
+    def __init__(self, embedder=None, threshold: float = SEMANTIC_CACHE_THRESHOLD,
+                 ttl: float = SEMANTIC_CACHE_TTL, max_per_user: int = SEMANTIC_CACHE_MAX_PER_USER):
+        self._embedder = embedder
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_per_user = max_per_user
+        self._users = {}  # user_id -> _UserIndex
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.bypassed = 0
+
+    @property
+    def embedder(self):
+        if self._embedder is None:
+            with self._lock:
+                if self._embedder is None:
+                    if SEMANTIC_CACHE_EMBEDDER not in EMBEDDERS:
+                        raise RuntimeError(f"Unknown SEMANTIC_CACHE_EMBEDDER '{SEMANTIC_CACHE_EMBEDDER}'. Use one of: {', '.join(EMBEDDERS)}")
+                    self._embedder = EMBEDDERS[SEMANTIC_CACHE_EMBEDDER]()
+        return self._embedder
+
+    def embed(self, prompt: str) -> np.ndarray:
+        return self.embedder.embed(prompt)
+
+    def lookup(self, user_id: str, vector: np.ndarray):
+        """The cached reply for the closest prompt of `user_id` above the threshold, else None."""
+        now = time.time()
+        with self._lock:
+            index = self._users.get(user_id)
+            if index is not None:
+                index.prune(now, self.max_per_user)
+            if index is None or not index.replies:
+                self.misses += 1
+                return None
+            scores = index.vectors @ vector
+            best = int(np.argmax(scores))
+            if scores[best] < self.threshold:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return index.replies[best]
+
+    def store(self, user_id: str, vector: np.ndarray, reply: str):
+        with self._lock:
+            index = self._users.get(user_id)
+            if index is None:
+                index = self._users[user_id] = _UserIndex(vector.shape[0])
+            index.vectors = np.vstack([index.vectors, vector[None, :]])
+            index.replies.append(reply)
+            index.expires = np.append(index.expires, time.time() + self.ttl)
+            index.prune(time.time(), self.max_per_user)
+
+    def record_bypass(self):
+        with self._lock:
+            self.bypassed += 1
+
+    def invalidate(self, user_id: str = None):
+        with self._lock:
+            if user_id is None:
+                self._users.clear()
+            else:
+                self._users.pop(user_id, None)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": SEMANTIC_CACHE_ENABLED,
+                "users": len(self._users),
+                "entries": sum(len(i.replies) for i in self._users.values()),
+                "hits": self.hits,
+                "misses": self.misses,
+                "bypassed": self.bypassed,
+                "hit_ratio": round(self.hits / lookups, 3) if lookups else 0.0
+            }
+
+
+semantic_cache = SemanticResponseCache()
+
+
+if __name__ == "__main__":
+    # Benchmark: near-duplicate chat turns against a 3s RAG round trip
+    RAG_LATENCY = 3.0
+    cache = SemanticResponseCache()
+    prompts = [
+        "The user feels sad. Be affirming and avoid advice overload.\nUser: I feel stressed about exams",
+        "The user feels sad. Be affirming and avoid advice overload.\nUser: I feel stressed about my exams",
+        "The user feels sad. Be affirming and avoid advice overload.\nUser: i feel stressed about exams!",
+        "The user feels sad. Be affirming and avoid advice overload.\nUser: I can't sleep before my exams",
+        "The user feels sad. Be affirming and avoid advice overload.\nUser: I feel stressed about exams",
+        "User: my friend ignored me today",
+    ]
+    cache.embed(prompts[0])  # load the model before timing
+    total = 0.0
+    for prompt in prompts:
+        start = time.perf_counter()
+        vector = cache.embed(prompt)
+        reply = cache.lookup("demo_user", vector)
+        if reply is None:
+            cache.store("demo_user", vector, f"reply to: {prompt[-30:]}")
+            total += RAG_LATENCY
+        total += time.perf_counter() - start
+        print(f"{'✅ hit ' if reply else '❌ miss'} {prompt.splitlines()[-1]}")
+    print(f"📊 {cache.embedder.name}: {cache.stats()}")
+    print(f"⏱️ {len(prompts)} turns: {total:.2f}s with cache vs {len(prompts) * RAG_LATENCY:.2f}s without")
+    print(f"🔒 other user sees nothing: {cache.lookup('other_user', cache.embed(prompts[0]))}")
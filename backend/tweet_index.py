@@ -0,0 +1,80 @@
+import time
+from sqlalchemy.exc import IntegrityError
+from .database import Base, SessionLocal, engine
+from .models import AnalyzedTweet
+
+# Local dedup index of analyzed tweet ids (a SQLite set next to the journal
+# tables). Monitoring polls check new tweet ids here first, so a tweet that was
+# already analyzed costs neither a DynamoDB read nor a Granite call.
+
+LOOKUP_CHUNK = 500  # ids per IN (...) query, well under SQLite's bound-parameter limit
+
+
+class AnalyzedTweetIndex:
+    def __init__(self, session_factory=SessionLocal):
+        self.session_factory = session_factory
+        self.lookups = 0
+        self.skipped = 0
+
+    def ensure_table(self, bind=engine):
+        Base.metadata.create_all(bind=bind, tables=[AnalyzedTweet.__table__])
+
+    def unseen(self, tweet_ids):
+        """The ids (in input order) that are not in the index yet."""
+        ids = [str(tweet_id) for tweet_id in tweet_ids]
+        seen = set()
+        with self.session_factory() as db:
+            for start in range(0, len(ids), LOOKUP_CHUNK):
+                chunk = ids[start:start + LOOKUP_CHUNK]
+                seen.update(tweet_id for (tweet_id,) in db.query(AnalyzedTweet.tweet_id).filter(AnalyzedTweet.tweet_id.in_(chunk)))
+        self.lookups += len(ids)
+        self.skipped += sum(1 for tweet_id in ids if tweet_id in seen)
+        return [tweet_id for tweet_id in ids if tweet_id not in seen]
+
+    def add(self, tweet_ids):
+        ids = list(dict.fromkeys(str(tweet_id) for tweet_id in tweet_ids))
+        if not ids:
+            return
+        now = time.time()
+        with self.session_factory() as db:
+            known = set()
+            for start in range(0, len(ids), LOOKUP_CHUNK):
+                chunk = ids[start:start + LOOKUP_CHUNK]
+                known.update(tweet_id for (tweet_id,) in db.query(AnalyzedTweet.tweet_id).filter(AnalyzedTweet.tweet_id.in_(chunk)))
+            missing = [tweet_id for tweet_id in ids if tweet_id not in known]
+            db.add_all(AnalyzedTweet(tweet_id=tweet_id, analyzed_at=now) for tweet_id in missing)
+            try:
+                db.commit()
+            except IntegrityError:
+                # Another worker indexed some of them meanwhile; add the rest one at a time
+                db.rollback()
+                for tweet_id in missing:
+                    try:
+                        db.add(AnalyzedTweet(tweet_id=tweet_id, analyzed_at=now))
+                        db.commit()
+                    except IntegrityError:
+                        db.rollback()
+
+    def stats(self):
+        with self.session_factory() as db:
+            size = db.query(AnalyzedTweet).count()
+        return {"indexed_tweets": size, "lookups": self.lookups, "skipped": self.skipped}
+
+
+if __name__ == "__main__":
+    # Benchmark: polling 1,000 quiet users (their last 10 tweets already analyzed) against the index
+    import tempfile
+    from sqlalchemy.orm import sessionmaker
+    from .database import create_db_engine
+
+    bench_engine = create_db_engine(f"sqlite:///{tempfile.mkdtemp()}/index.db")
+    index = AnalyzedTweetIndex(sessionmaker(autocommit=False, autoflush=False, bind=bench_engine))
+    index.ensure_table(bench_engine)
+    users = [[f"{user}{n:04d}" for n in range(10)] for user in range(1000, 2000)]
+    index.add(tweet_id for tweets in users for tweet_id in tweets)
+
+    start = time.perf_counter()
+    new = sum(len(index.unseen(tweets)) for tweets in users)
+    elapsed = time.perf_counter() - start
+    print(f"📊 {len(users)} polls in {elapsed * 1000:.0f}ms ({elapsed * 1e6 / len(users):.0f}µs each), "
+          f"{new} tweets left to analyze, 0 DynamoDB reads (was {sum(map(len, users))} get_item calls)")
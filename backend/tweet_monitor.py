@@ -0,0 +1,284 @@
+import os
+import random
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from sqlalchemy import and_, update
+from .database import Base, SessionLocal, engine
+from .models import TweetMonitorState
+
+# Tweet risk monitoring for many Twitter handles.
+# Every handle has a row in tweet_monitor_state holding its popup state and
+# when it is next due. A scheduler tick (every TWEET_MONITOR_TICK seconds)
+# claims the due handles of this process's shard and checks them in parallel.
+#   - jitter: first checks are spread over one interval and every interval is
+#     randomized by ±TWEET_MONITOR_JITTER, so checks never fire all together
+#   - sharding: with TWEET_MONITOR_SHARDS=N, worker process i
+#     (TWEET_MONITOR_SHARD=i) only handles usernames whose hash % N == i;
+#     claims are atomic, so overlapping workers never check a handle twice
+#   - adaptive interval: handles with recent high risk are polled more often
+
+TWEET_MONITOR_HANDLES = [h.strip() for h in os.getenv("TWEET_MONITOR_HANDLES", "GauthamSalian31").split(",") if h.strip()]
+TWEET_MONITOR_INTERVAL = float(os.getenv("TWEET_MONITOR_INTERVAL", str(17 * 60)))
+TWEET_MONITOR_MIN_INTERVAL = float(os.getenv("TWEET_MONITOR_MIN_INTERVAL", str(5 * 60)))
+TWEET_MONITOR_JITTER = float(os.getenv("TWEET_MONITOR_JITTER", "0.1"))
+TWEET_MONITOR_TICK = float(os.getenv("TWEET_MONITOR_TICK", "30"))
+TWEET_MONITOR_BATCH = int(os.getenv("TWEET_MONITOR_BATCH", "50"))  # handles claimed per tick
+TWEET_MONITOR_WORKERS = int(os.getenv("TWEET_MONITOR_WORKERS", "8"))
+TWEET_MONITOR_SHARDS = int(os.getenv("TWEET_MONITOR_SHARDS", "1"))
+TWEET_MONITOR_SHARD = int(os.getenv("TWEET_MONITOR_SHARD", "0"))
+TWEET_MONITOR_LEASE = float(os.getenv("TWEET_MONITOR_LEASE", "600"))  # a crashed worker's claims expire after this
+TWEET_MONITOR_MAX_HANDLES = int(os.getenv("TWEET_MONITOR_MAX_HANDLES", "10000"))  # cap on handles added through the API
+TWEET_POLL_PAGE_SIZE = int(os.getenv("TWEET_POLL_PAGE_SIZE", "100"))  # Twitter allows 5-100 per timeline page
+TWEET_POLL_MAX_PAGES = int(os.getenv("TWEET_POLL_MAX_PAGES", "10"))
+
+HIGH_RISK = 0.85  # same threshold that shows the support popup
+ELEVATED_RISK = 0.5
+
+
+def shard_key(username: str) -> int:
+    return zlib.crc32(username.lower().encode())
+
+
+def next_interval(risk: float, base: float = TWEET_MONITOR_INTERVAL, minimum: float = TWEET_MONITOR_MIN_INTERVAL) -> float:
+    if risk >= HIGH_RISK:
+        return minimum
+    if risk >= ELEVATED_RISK:
+        return max(minimum, base / 2)
+    return base
+
+
+def jittered(interval: float, jitter: float = TWEET_MONITOR_JITTER) -> float:
+    return interval * random.uniform(1 - jitter, 1 + jitter)
+
+
+def advance_since_id(since_id, fetched_ids, failed_ids=(), complete: bool = True):
+    """The since_id for the next poll, never past a tweet that still has to be analyzed.
+
+    Tweet ids are snowflakes, so numeric order is posting order. With
+    failures the cursor stops just below the oldest failed tweet (newer
+    successes are skipped by the tweet index when they come back); when the
+    poll didn't fetch every page, older tweets are still unread and the
+    cursor stays put.
+    """
+    fetched = [int(tweet_id) for tweet_id in fetched_ids]
+    if not complete or not fetched:
+        return since_id
+    failed = [int(tweet_id) for tweet_id in failed_ids]
+    if failed:
+        older = [tweet_id for tweet_id in fetched if tweet_id < min(failed)]
+        return str(max(older)) if older else since_id
+    return str(max(fetched))
+
+
+def empty_state():
+    return {"show_popup": False, "support_message": None, "last_checked": None, "risky_tweet_text": None}
+
+
+def _state_dict(row: TweetMonitorState):
+    return {
+        "show_popup": bool(row.show_popup),
+        "support_message": row.support_message,
+        "last_checked": datetime.utcfromtimestamp(row.last_checked) if row.last_checked else None,
+        "risky_tweet_text": row.risky_tweet_text
+    }
+
+
+class TweetMonitor:
+    """Runs `check(username, since_id)` for due handles.
+
+    The check returns a dict with since_id (newest tweet id seen) and
+    new_tweets (how many it analyzed), plus, when there were new tweets,
+    probability_of_risk, show_popup, support_message, risky_tweet_text and
+    popup_expires_at. A popup is kept until it expires unless a newer risky
+    tweet replaces it; calm tweets in between don't clear it.
+    """
+
+    def __init__(self, check, session_factory=SessionLocal, shards: int = TWEET_MONITOR_SHARDS,
+                 shard: int = TWEET_MONITOR_SHARD, batch: int = TWEET_MONITOR_BATCH, workers: int = TWEET_MONITOR_WORKERS):
+        self.check = check
+        self.session_factory = session_factory
+        self.shards = max(1, shards)
+        self.shard = shard % self.shards
+        self.batch = batch
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="tweet-monitor")
+        self.checks = 0
+        self.failures = 0
+
+    def ensure_table(self, bind=engine):
+        Base.metadata.create_all(bind=bind, tables=[TweetMonitorState.__table__])
+
+    def register(self, username: str, now: float = None):
+        """Start monitoring `username` (no-op if already registered); returns its state."""
+        now = time.time() if now is None else now
+        with self.session_factory() as db:
+            row = db.get(TweetMonitorState, username)
+            if row is None:
+                row = TweetMonitorState(
+                    username=username,
+                    shard_key=shard_key(username),
+                    interval_seconds=TWEET_MONITOR_INTERVAL,
+                    # Spread first checks over one interval instead of firing them all at startup
+                    next_check_at=now + random.uniform(0, TWEET_MONITOR_INTERVAL),
+                    last_risk=0.0,
+                    show_popup=False,
+                    consecutive_failures=0
+                )
+                db.add(row)
+                db.commit()
+            return _state_dict(row)
+
+    def get_state(self, username: str):
+        """Popup state for `username` by primary key, or None if it isn't monitored."""
+        with self.session_factory() as db:
+            row = db.get(TweetMonitorState, username)
+            return _state_dict(row) if row is not None else None
+
+    def _claim_due(self, now: float):
+        with self.session_factory() as db:
+            candidates = db.query(TweetMonitorState.username, TweetMonitorState.since_id).filter(
+                TweetMonitorState.next_check_at <= now,
+                TweetMonitorState.shard_key % self.shards == self.shard
+            ).order_by(TweetMonitorState.next_check_at).limit(self.batch).all()
+
+            claimed = []
+            for username, since_id in candidates:
+                # Conditional update: only one process wins a handle, even with overlapping shards
+                result = db.execute(update(TweetMonitorState).where(and_(
+                    TweetMonitorState.username == username,
+                    TweetMonitorState.next_check_at <= now
+                )).values(next_check_at=now + TWEET_MONITOR_LEASE))
+                if result.rowcount == 1:
+                    claimed.append((username, since_id))
+            db.commit()
+            return claimed
+
+    def _record(self, username: str, outcome: dict = None, error: Exception = None):
+        now = time.time()
+        with self.session_factory() as db:
+            row = db.get(TweetMonitorState, username)
+            if row is None:
+                return
+            row.last_checked = now
+            if error is not None:
+                print(f"Scheduler error for {username}: {error}")
+                row.consecutive_failures = (row.consecutive_failures or 0) + 1
+                row.show_popup = False
+                interval = TWEET_MONITOR_INTERVAL
+            else:
+                row.consecutive_failures = 0
+                row.since_id = outcome.get("since_id") or row.since_id
+                new_tweets = outcome.get("new_tweets", 1)
+                popup_active = bool(row.show_popup) and (row.popup_expires_at is None or row.popup_expires_at > now)
+                if new_tweets and outcome.get("show_popup"):
+                    # A newer risky tweet replaces the popup
+                    row.last_risk = outcome.get("probability_of_risk", 0.0)
+                    row.show_popup = True
+                    row.support_message = outcome.get("support_message")
+                    row.risky_tweet_text = outcome.get("risky_tweet_text")
+                    row.popup_expires_at = outcome.get("popup_expires_at")
+                else:
+                    if not popup_active:
+                        row.show_popup = False
+                        row.support_message = None
+                        row.risky_tweet_text = None
+                        row.popup_expires_at = None
+                    new_risk = outcome.get("probability_of_risk", 0.0) if new_tweets else 0.0
+                    # While a popup is pending the handle stays on the short interval;
+                    # a quiet user with nothing pending goes back to the base interval
+                    row.last_risk = max(new_risk, row.last_risk or 0.0) if popup_active else new_risk
+                interval = next_interval(row.last_risk)
+            row.interval_seconds = interval
+            row.next_check_at = now + jittered(interval)
+            db.commit()
+
+    def _run_check(self, claim):
+        username, since_id = claim
+        try:
+            outcome = self.check(username, since_id)
+        except Exception as e:
+            self.failures += 1
+            self._record(username, error=e)
+        else:
+            self._record(username, outcome)
+        self.checks += 1
+
+    def check_now(self, username: str):
+        """Check one handle immediately (registering it if needed) and return its state."""
+        self.register(username)
+        with self.session_factory() as db:
+            since_id = db.get(TweetMonitorState, username).since_id
+        self._run_check((username, since_id))
+        return self.get_state(username)
+
+    def tick(self, now: float = None):
+        """Check every due handle of this shard; returns how many were checked."""
+        claimed = self._claim_due(time.time() if now is None else now)
+        list(self.pool.map(self._run_check, claimed))
+        return len(claimed)
+
+    def stats(self):
+        now = time.time()
+        with self.session_factory() as db:
+            shard_filter = TweetMonitorState.shard_key % self.shards == self.shard
+            return {
+                "handles": db.query(TweetMonitorState).count(),
+                "shard": f"{self.shard}/{self.shards}",
+                "shard_handles": db.query(TweetMonitorState).filter(shard_filter).count(),
+                "shard_due": db.query(TweetMonitorState).filter(shard_filter, TweetMonitorState.next_check_at <= now).count(),
+                "checks": self.checks,
+                "failures": self.failures
+            }
+
+
+if __name__ == "__main__":
+    # Benchmark: 5,000 handles across 4 worker shards, with a 20ms fake check
+    import tempfile
+    from collections import Counter
+    from sqlalchemy.orm import sessionmaker
+    from .database import create_db_engine
+
+    HANDLES = 5000
+    SHARDS = 4
+    bench_engine = create_db_engine(f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'monitor.db')}")
+    Session = sessionmaker(autocommit=False, autoflush=False, bind=bench_engine)
+    checked = Counter()
+
+    def fake_check(username, since_id):
+        time.sleep(0.02)
+        checked[username] += 1
+        risk = 0.9 if username.endswith("7") else 0.1
+        return {"since_id": "1", "new_tweets": 1, "probability_of_risk": risk, "show_popup": risk > HIGH_RISK,
+                "support_message": "I'm here for you." if risk > HIGH_RISK else None, "risky_tweet_text": None,
+                "popup_expires_at": time.time() + 86400 if risk > HIGH_RISK else None}
+
+    monitors = [TweetMonitor(fake_check, Session, shards=SHARDS, shard=i, batch=HANDLES) for i in range(SHARDS)]
+    monitors[0].ensure_table(bench_engine)
+    start = time.time()
+    for i in range(HANDLES):
+        monitors[0].register(f"user_{i}", now=start)
+
+    with Session() as db:
+        due = [row.next_check_at - start for row in db.query(TweetMonitorState)]
+    per_tick = Counter(int(offset // TWEET_MONITOR_TICK) for offset in due)
+    print(f"📅 first checks spread over {len(per_tick)} ticks, busiest tick {max(per_tick.values())} of {HANDLES} handles")
+
+    # Every shard ticks "one interval later", when every handle is due
+    later = start + TWEET_MONITOR_INTERVAL
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=SHARDS) as pool:
+        counts = list(pool.map(lambda m: m.tick(now=later), monitors))
+    elapsed = time.perf_counter() - t0
+    print(f"📊 {SHARDS} shards checked {counts} handles in {elapsed:.2f}s; "
+          f"duplicates: {sum(1 for c in checked.values() if c > 1)}, missed: {HANDLES - len(checked)}")
+
+    with Session() as db:
+        risky = db.get(TweetMonitorState, "user_7").interval_seconds
+        calm = db.get(TweetMonitorState, "user_8").interval_seconds
+    print(f"⏱️ next interval: high-risk handle {risky / 60:.0f} min, calm handle {calm / 60:.0f} min")
+
+    t0 = time.perf_counter()
+    for i in range(1000):
+        monitors[0].get_state(f"user_{i * 5}")
+    print(f"🔎 trigger_check lookup: {(time.perf_counter() - t0) * 1000:.3f}µs avg over 1000 handles")
@@ -0,0 +1,332 @@
+import base64
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from boto3.dynamodb.conditions import Attr, Key
+from botocore.exceptions import ClientError
+from .granite_batch import parse_risk_output
+
+# Concurrent tweet risk analysis.
+# A batch of tweets costs one BatchGetItem round trip per 100 tweets to find
+# analyses already in TweetRiskAnalysis, Granite calls for the rest running in
+# parallel under TWEET_ANALYSIS_CONCURRENCY, and one batch write for the new
+# results, instead of a get_item + generate + get_item + put_item per tweet.
+#
+# Reading analyses back is paged: each page is one Query on the per-user index
+# TWEET_RISK_USER_INDEX (partition key username, sort key created_at) when a
+# user is given, otherwise a Scan, projected to the fields the API returns.
+# Items stored before the username / numeric probability_of_risk attributes
+# existed only show up in unfiltered reads.
+
+TWEET_RISK_TABLE = "TweetRiskAnalysis"
+TWEET_ANALYSIS_CONCURRENCY = int(os.getenv("TWEET_ANALYSIS_CONCURRENCY", "16"))
+BATCH_GET_LIMIT = 100  # DynamoDB BatchGetItem maximum keys per request
+BATCH_GET_RETRIES = 5
+TWEET_RISK_USER_INDEX = os.getenv("TWEET_RISK_USER_INDEX", "username-created_at-index")
+TWEET_RISK_PAGE_SIZE = int(os.getenv("TWEET_RISK_PAGE_SIZE", "100"))
+ANALYSIS_PROJECTION = "tweet_id, created_at, #text, risk_detected, confidence_score, explanation"
+ANALYSIS_PROJECTION_NAMES = {"#text": "text"}  # "text" is a DynamoDB reserved word
+
+
+def build_risk_prompt(text: str) -> str:
+    return f"""
+            <risk_evaluation>
+            <text>{text}</text>
+
+            Analyze this text for emotional or psychological risk. Respond using structured XML format:
+
+            <harm>[Yes or No]</harm>
+            <confidence>[Numeric probability between 0.0 (no risk) and 1.0 (high risk)]</confidence>
+            <comment>[Brief reason why the risk was assessed]</comment>
+
+            Your confidence score should directly reflect the probability of risk based on language, tone, and context.
+            </risk_evaluation>
+            """
+
+
+def _probability(confidence_str) -> float:
+    try:
+        return float(confidence_str)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _unknown_result(text: str):
+    # The Granite call failed: nothing was stored, so the tweet should be retried.
+    # An answer Granite gave without a <harm> tag is stored as "Unknown" instead and is final.
+    return {
+        "text": text,
+        "risk_detected": "Unknown",
+        "confidence": "Unknown",
+        "probability_of_risk": 0.0,
+        "analysis_failed": True,
+    }
+
+
+def _result_from_item(item: dict):
+    return {
+        "text": item['text'],
+        "risk_detected": item['risk_detected'],
+        "created_at": item['created_at'],
+        "confidence": item['confidence_score'],
+        "probability_of_risk": _probability(item['confidence_score']),
+        "explanation": item['explanation'],
+    }
+
+
+def fetch_existing_analyses(dynamodb, tweet_ids):
+    """tweet_id -> stored TweetRiskAnalysis item, via BatchGetItem in chunks of 100."""
+    found = {}
+    ids = list(dict.fromkeys(tweet_ids))
+    for start in range(0, len(ids), BATCH_GET_LIMIT):
+        request = {TWEET_RISK_TABLE: {"Keys": [{"tweet_id": tweet_id} for tweet_id in ids[start:start + BATCH_GET_LIMIT]]}}
+        for attempt in range(BATCH_GET_RETRIES):
+            response = dynamodb.batch_get_item(RequestItems=request)
+            for item in response.get("Responses", {}).get(TWEET_RISK_TABLE, []):
+                found[item["tweet_id"]] = item
+            request = response.get("UnprocessedKeys") or {}
+            if not request:
+                break
+            time.sleep(0.05 * 2 ** attempt)  # throttled: back off before retrying the leftovers
+        else:
+            print(f"⚠️ {len(request[TWEET_RISK_TABLE]['Keys'])} tweet analyses still unprocessed after retries")
+    return found
+
+
+def analyze_tweets_concurrently(tweets, dynamodb, generate, max_workers: int = TWEET_ANALYSIS_CONCURRENCY, username: str = None):
+    """Analyze (tweet_id, text, created_at) tuples; results come back in input order.
+
+    `generate(prompt)` returns Granite's generated text for one prompt. New
+    analyses are stored under `username` so they can be read back per user.
+    """
+    tweets = [(str(tweet_id) if tweet_id else "unknown_id", text, created_at) for tweet_id, text, created_at in tweets]
+
+    # 🗃️ Step 1: analyses that already exist, in one round trip per 100 tweets
+    try:
+        existing = fetch_existing_analyses(dynamodb, [tweet_id for tweet_id, _, _ in tweets])
+    except Exception as e:
+        print("🛑 Analyze error:", str(e))
+        existing = {}
+    if existing:
+        print(f"🔁 Found existing analysis for {len(existing)} of {len(tweets)} tweets")
+
+    # Step 2: each new tweet is sent to Granite once, several at a time
+    pending = {}
+    for tweet_id, text, created_at in tweets:
+        if tweet_id not in existing and tweet_id not in pending:
+            pending[tweet_id] = (text, created_at)
+
+    def score(tweet_id):
+        text, created_at = pending[tweet_id]
+        try:
+            label, confidence_str, explanation = parse_risk_output(generate(build_risk_prompt(text)))
+        except Exception as e:
+            print(f"🛑 Granite analysis failed for tweet {tweet_id}: {e}")
+            return tweet_id, None
+        item = {
+            'tweet_id': tweet_id,
+            'text': text,
+            'created_at': created_at,
+            'risk_detected': label,
+            'confidence_score': confidence_str,
+            'probability_of_risk': Decimal(str(_probability(confidence_str))),
+            'explanation': explanation
+        }
+        if username:
+            item['username'] = username.lower()
+        return tweet_id, item
+
+    analyzed = {}
+    if pending:
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(pending)))) as pool:
+            analyzed = {tweet_id: item for tweet_id, item in pool.map(score, pending) if item is not None}
+
+    # Step 3: new analyses in one batch write (25 items per request, retried by boto3)
+    if analyzed:
+        try:
+            with dynamodb.Table(TWEET_RISK_TABLE).batch_writer(overwrite_by_pkeys=["tweet_id"]) as batch:
+                for item in analyzed.values():
+                    batch.put_item(Item=item)
+        except Exception as e:
+            print(f"🛑 Failed to store {len(analyzed)} tweet analyses: {e}")
+
+    results = []
+    for tweet_id, text, created_at in tweets:
+        if tweet_id in existing:
+            results.append(_result_from_item(existing[tweet_id]))
+        elif tweet_id in analyzed:
+            item = analyzed[tweet_id]
+            results.append({
+                "text": text,
+                "risk_detected": item['risk_detected'],
+                "confidence": item['confidence_score'],
+                "probability_of_risk": _probability(item['confidence_score']),
+                "explanation": item['explanation']
+            })
+        else:
+            results.append(_unknown_result(text))
+    return results
+
+
+def encode_analysis_cursor(last_key) -> str:
+    return base64.urlsafe_b64encode(json.dumps(last_key, separators=(",", ":")).encode()).decode()
+
+
+def decode_analysis_cursor(cursor: str) -> dict:
+    """LastEvaluatedKey from an opaque cursor; raises ValueError for anything else."""
+    try:
+        key = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except Exception:
+        raise ValueError("Invalid cursor.")
+    if not isinstance(key, dict) or not all(isinstance(v, str) for v in key.values()) or "tweet_id" not in key:
+        raise ValueError("Invalid cursor.")
+    return key
+
+
+def serialize_analysis(item: dict):
+    return {
+        "date": item.get("created_at", "Unknown"),
+        "text": item.get("text", ""),
+        "risk_detected": item.get("risk_detected", "Unknown"),
+        "confidence": item.get("confidence_score", "Unknown"),
+        "probability_of_risk": _probability(item.get("confidence_score")),
+        "explanation": item.get("explanation", "Not provided"),
+        "tweet_id": item.get("tweet_id", "")
+    }
+
+
+def fetch_analysis_page(table, username: str = None, start: str = None, end: str = None, min_probability: float = None,
+                        limit: int = TWEET_RISK_PAGE_SIZE, after: dict = None):
+    """(items, LastEvaluatedKey or None) for up to `limit` stored analyses matching the filters.
+
+    `start` and `end` are ISO dates, both inclusive. Filtered reads may
+    evaluate several DynamoDB pages to fill one API page.
+    """
+    kwargs = {"ProjectionExpression": ANALYSIS_PROJECTION, "ExpressionAttributeNames": dict(ANALYSIS_PROJECTION_NAMES)}
+    filters = []
+    date_from = start or ""
+    date_to = (end + "T23:59:59.999Z") if end else "\uffff"
+    if min_probability is not None:
+        filters.append(Attr("probability_of_risk").gte(Decimal(str(min_probability))))
+
+    if username:
+        condition = Key("username").eq(username.lower())
+        if start or end:
+            condition = condition & Key("created_at").between(date_from, date_to)
+        read = table.query
+        kwargs.update(IndexName=TWEET_RISK_USER_INDEX, KeyConditionExpression=condition)
+    else:
+        if start or end:
+            filters.append(Attr("created_at").between(date_from, date_to))
+        read = table.scan
+    if filters:
+        condition = filters[0]
+        for extra in filters[1:]:
+            condition = condition & extra
+        kwargs["FilterExpression"] = condition
+
+    items = []
+    while len(items) < limit:
+        if after:
+            kwargs["ExclusiveStartKey"] = after
+        kwargs["Limit"] = limit - len(items)  # never evaluate past the last item we can return
+        try:
+            response = read(**kwargs)
+        except ClientError as e:
+            if not username or e.response.get("Error", {}).get("Code") != "ValidationException" or "IndexName" not in kwargs:
+                raise
+            # Index not created yet: fall back to a filtered scan so per-user reads still work
+            print(f"⚠️ {TWEET_RISK_USER_INDEX} unavailable ({e}); scanning for {username}")
+            kwargs.pop("IndexName")
+            user_filter = Attr("username").eq(username.lower())
+            if start or end:
+                user_filter = user_filter & Attr("created_at").between(date_from, date_to)
+            kwargs["FilterExpression"] = user_filter & kwargs["FilterExpression"] if "FilterExpression" in kwargs else user_filter
+            kwargs.pop("KeyConditionExpression")
+            read = table.scan
+            continue
+        items.extend(response.get("Items", []))
+        after = response.get("LastEvaluatedKey")
+        if not after:
+            break
+    return items, after
+
+
+if __name__ == "__main__":
+    # Benchmark: 100 tweets (20 already analyzed) against a 0.5s Granite call and 10ms Dynamo calls
+    MODEL_LATENCY = 0.5
+    DYNAMO_LATENCY = 0.01
+
+    class FakeTable:
+        def __init__(self, store):
+            self.store = store
+
+        def get_item(self, Key):
+            time.sleep(DYNAMO_LATENCY)
+            item = self.store.get(Key["tweet_id"])
+            return {"Item": item} if item else {}
+
+        def put_item(self, Item):
+            time.sleep(DYNAMO_LATENCY)
+            self.store[Item["tweet_id"]] = Item
+
+        def batch_writer(self, overwrite_by_pkeys=None):
+            table = self
+
+            class Writer:
+                def __enter__(self):
+                    return self
+
+                def put_item(self, Item):
+                    table.store[Item["tweet_id"]] = Item
+
+                def __exit__(self, *exc):
+                    time.sleep(DYNAMO_LATENCY)
+
+            return Writer()
+
+    class FakeDynamo:
+        def __init__(self):
+            self.store = {}
+
+        def Table(self, name):
+            return FakeTable(self.store)
+
+        def batch_get_item(self, RequestItems):
+            time.sleep(DYNAMO_LATENCY)
+            keys = RequestItems[TWEET_RISK_TABLE]["Keys"]
+            return {"Responses": {TWEET_RISK_TABLE: [self.store[k["tweet_id"]] for k in keys if k["tweet_id"] in self.store]}}
+
+    def fake_generate(prompt):
+        time.sleep(MODEL_LATENCY)
+        return "<harm>No</harm><confidence>0.12</confidence><comment>Everyday frustration.</comment>"
+
+    tweets = [(str(1000 + i), f"tweet number {i} about my day", "2025-01-01T00:00:00.000Z") for i in range(100)]
+
+    def seeded():
+        dynamo = FakeDynamo()
+        for tweet_id, text, created_at in tweets[:20]:
+            dynamo.store[tweet_id] = {"tweet_id": tweet_id, "text": text, "created_at": created_at,
+                                      "risk_detected": "No", "confidence_score": "0.1", "explanation": "cached"}
+        return dynamo
+
+    # What analyze_tweet used to do per tweet: get_item, generate, then get_item + put_item
+    dynamo = seeded()
+    table = dynamo.Table(TWEET_RISK_TABLE)
+    start = time.perf_counter()
+    for tweet_id, text, created_at in tweets:
+        if "Item" in table.get_item(Key={"tweet_id": tweet_id}):
+            continue
+        label, confidence, comment = parse_risk_output(fake_generate(build_risk_prompt(text)))
+        if "Item" not in table.get_item(Key={"tweet_id": tweet_id}):
+            table.put_item(Item={"tweet_id": tweet_id, "text": text, "created_at": created_at, "risk_detected": label,
+                                 "confidence_score": confidence, "explanation": comment})
+    print(f"📊 sequential: {len(tweets)} tweets in {time.perf_counter() - start:.2f}s")
+
+    dynamo = seeded()
+    start = time.perf_counter()
+    results = analyze_tweets_concurrently(tweets, dynamo, fake_generate)
+    print(f"📊 concurrent ({TWEET_ANALYSIS_CONCURRENCY} workers): {len(results)} tweets in {time.perf_counter() - start:.2f}s, "
+          f"{len(dynamo.store)} analyses stored")
@@ -0,0 +1,178 @@
+import os
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+from .database import Base, SessionLocal, engine
+from .models import TwitterUser
+
+# Twitter username -> user id resolution, cached.
+# Numeric ids practically never change, so resolutions live in memory and in
+# the twitter_users table (surviving restarts) for TWITTER_USER_TTL; handles
+# Twitter reports as not found are remembered for the shorter
+# TWITTER_NEGATIVE_TTL so a typo doesn't cost a lookup on every poll.
+# API errors (rate limits, outages) are never cached.
+
+TWITTER_API_URL = "https://api.twitter.com/2"
+TWITTER_USER_TTL = float(os.getenv("TWITTER_USER_TTL", str(7 * 24 * 3600)))
+TWITTER_NEGATIVE_TTL = float(os.getenv("TWITTER_NEGATIVE_TTL", "3600"))
+TWITTER_POOL_SIZE = int(os.getenv("TWITTER_POOL_SIZE", "16"))
+TWITTER_TIMEOUT = float(os.getenv("TWITTER_TIMEOUT", "10"))
+
+
+class TwitterUserNotFound(Exception):
+    pass
+
+
+def create_twitter_session(bearer_token: str) -> requests.Session:
+    """One pooled, keep-alive session for every Twitter API call."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=TWITTER_POOL_SIZE)
+    session.mount("https://", adapter)
+    session.headers["Authorization"] = f"Bearer {bearer_token}"
+    return session
+
+
+def lookup_user_id(session: requests.Session, username: str) -> str:
+    response = session.get(f"{TWITTER_API_URL}/users/by/username/{username}", timeout=TWITTER_TIMEOUT)
+    resp_json = response.json()
+    if "data" in resp_json:
+        return resp_json["data"]["id"]
+    errors = resp_json.get("errors") or []
+    if any(e.get("title") == "Not Found Error" or str(e.get("type", "")).endswith("resource-not-found") for e in errors):
+        raise TwitterUserNotFound(f"User not found: {username}")
+    raise Exception(f"User not found or API error: {resp_json}")
+
+
+class UsernameCache:
+    def __init__(self, resolve, session_factory=SessionLocal, ttl: float = TWITTER_USER_TTL,
+                 negative_ttl: float = TWITTER_NEGATIVE_TTL):
+        self.resolve = resolve  # username -> user id; raises TwitterUserNotFound for unknown handles
+        self.session_factory = session_factory
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._memory = {}  # username -> (user_id or None, expires_at)
+        self._lock = threading.Lock()
+        # Each lookup counts exactly once: negative_hits are cached "not found" answers
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+
+    def ensure_table(self, bind=engine):
+        Base.metadata.create_all(bind=bind, tables=[TwitterUser.__table__])
+
+    def _expiry(self, user_id, resolved_at: float) -> float:
+        return resolved_at + (self.ttl if user_id is not None else self.negative_ttl)
+
+    def _answer(self, username: str, user_id):
+        if user_id is None:
+            raise TwitterUserNotFound(f"User not found: {username}")
+        return user_id
+
+    def get(self, username: str) -> str:
+        key = username.lower()
+        now = time.time()
+        with self._lock:
+            cached = self._memory.get(key)
+            if cached is not None and cached[1] > now:
+                if cached[0] is None:
+                    self.negative_hits += 1
+                else:
+                    self.memory_hits += 1
+                hit = True
+            else:
+                hit = False
+        if hit:
+            return self._answer(username, cached[0])
+
+        with self.session_factory() as db:
+            row = db.get(TwitterUser, key)
+            if row is not None and self._expiry(row.user_id, row.resolved_at) > now:
+                with self._lock:
+                    if row.user_id is None:
+                        self.negative_hits += 1
+                    else:
+                        self.disk_hits += 1
+                    self._memory[key] = (row.user_id, self._expiry(row.user_id, row.resolved_at))
+                return self._answer(username, row.user_id)
+
+        with self._lock:
+            self.misses += 1
+        try:
+            user_id = self.resolve(username)
+        except TwitterUserNotFound:
+            user_id = None
+        self._store(key, user_id, now)
+        if user_id is None:
+            raise TwitterUserNotFound(f"User not found: {username}")
+        return user_id
+
+    def _store(self, key: str, user_id, now: float):
+        with self._lock:
+            self._memory[key] = (user_id, self._expiry(user_id, now))
+        with self.session_factory() as db:
+            db.merge(TwitterUser(username=key, user_id=user_id, resolved_at=now))
+            db.commit()
+
+    def invalidate(self, username: str):
+        key = username.lower()
+        with self._lock:
+            self._memory.pop(key, None)
+        with self.session_factory() as db:
+            row = db.get(TwitterUser, key)
+            if row is not None:
+                db.delete(row)
+                db.commit()
+
+    def stats(self):
+        with self._lock:
+            hits = self.memory_hits + self.disk_hits + self.negative_hits
+            lookups = hits + self.misses
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "negative_hits": self.negative_hits,
+                "misses": self.misses,
+                "hit_ratio": round(hits / lookups, 3) if lookups else 0.0
+            }
+
+
+if __name__ == "__main__":
+    # Benchmark: 17-minute polls of 200 handles over a day (5 unknown), against a 150ms lookup
+    import tempfile
+    from sqlalchemy.orm import sessionmaker
+    from .database import create_db_engine
+
+    LOOKUP_LATENCY = 0.15
+    handles = [f"user_{i}" for i in range(195)] + [f"typo_{i}" for i in range(5)]
+    polls_per_day = 24 * 60 // 17
+    api_calls = 0
+
+    def fake_lookup(username):
+        global api_calls
+        api_calls += 1
+        if username.startswith("typo_"):
+            raise TwitterUserNotFound(username)
+        return str(abs(hash(username)))
+
+    bench_engine = create_db_engine(f"sqlite:///{tempfile.mkdtemp()}/users.db")
+    Session = sessionmaker(autocommit=False, autoflush=False, bind=bench_engine)
+    cache = UsernameCache(fake_lookup, Session, negative_ttl=3600)
+    cache.ensure_table(bench_engine)
+
+    start = time.perf_counter()
+    for poll in range(polls_per_day):
+        for handle in handles:
+            try:
+                cache.get(handle)
+            except TwitterUserNotFound:
+                pass
+    elapsed = time.perf_counter() - start
+    lookups = polls_per_day * len(handles)
+    print(f"📊 {lookups} resolutions: {api_calls} API calls, {elapsed:.2f}s in cache vs ~{lookups * LOOKUP_LATENCY / 60:.0f} min uncached")
+    print(f"📈 {cache.stats()}")
+
+    restarted = UsernameCache(fake_lookup, Session)
+    restarted.get("user_1")
+    print(f"🔁 after restart: {restarted.stats()}")
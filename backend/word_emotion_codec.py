@@ -0,0 +1,73 @@
+import re
+import struct
+import numpy as np
+
+# Compact storage for a journal's word emotions: one blob per entry instead of
+# one row per token. Words are not stored; each token is an offset/length
+# into the journal text.
+#
+# Layout (little endian):
+#   header   version u8 | label count u8 | word count u32
+#   labels   per label: byte length u8 + utf-8 bytes (index = label id)
+#   ids      u8[n]    label id per token
+#   scores   f16[n]   score per token
+#   starts   u32[n]   token start offset into the text
+#   lengths  u16[n]   token length
+
+CODEC_VERSION = 1
+_HEADER = struct.Struct("<BBI")
+_TOKEN_PATTERN = re.compile(r"\S+")
+
+
+def tokenize_with_offsets(text: str):
+    """Same tokens as text.split(), with their (start, length) in `text`."""
+    return [(m.group(0), m.start(), m.end() - m.start()) for m in _TOKEN_PATTERN.finditer(text or "")]
+
+
+def pack_word_emotions(text: str, word_emotions) -> bytes:
+    tokens = tokenize_with_offsets(text)
+    if [token for token, _, _ in tokens] != [w["text"] for w in word_emotions]:
+        raise ValueError("Word emotions do not match the tokens of the journal text")
+    if any(length > 0xFFFF for _, _, length in tokens):
+        raise ValueError("Token too long to pack")
+
+    labels = list(dict.fromkeys(w["emotion"] for w in word_emotions))
+    if len(labels) > 255:
+        raise ValueError("Too many distinct emotion labels to pack")
+    label_ids = {label: i for i, label in enumerate(labels)}
+
+    parts = [_HEADER.pack(CODEC_VERSION, len(labels), len(tokens))]
+    for label in labels:
+        encoded = label.encode("utf-8")
+        parts.append(struct.pack("<B", len(encoded)) + encoded)
+    parts.append(np.array([label_ids[w["emotion"]] for w in word_emotions], dtype="<u1").tobytes())
+    parts.append(np.array([w["score"] for w in word_emotions], dtype="<f2").tobytes())
+    parts.append(np.array([start for _, start, _ in tokens], dtype="<u4").tobytes())
+    parts.append(np.array([length for _, _, length in tokens], dtype="<u2").tobytes())
+    return b"".join(parts)
+
+
+def unpack_word_emotions(text: str, blob: bytes):
+    version, label_count, n = _HEADER.unpack_from(blob, 0)
+    if version != CODEC_VERSION:
+        raise ValueError(f"Unsupported word emotion blob version {version}")
+
+    offset = _HEADER.size
+    labels = []
+    for _ in range(label_count):
+        size = blob[offset]
+        labels.append(blob[offset + 1:offset + 1 + size].decode("utf-8"))
+        offset += 1 + size
+
+    ids = np.frombuffer(blob, dtype="<u1", count=n, offset=offset)
+    offset += n
+    scores = np.frombuffer(blob, dtype="<f2", count=n, offset=offset).astype(np.float64).round(3)
+    offset += 2 * n
+    starts = np.frombuffer(blob, dtype="<u4", count=n, offset=offset)
+    offset += 4 * n
+    lengths = np.frombuffer(blob, dtype="<u2", count=n, offset=offset)
+
+    return [
+        {"text": text[start:start + length], "emotion": labels[label_id], "score": score}
+        for label_id, score, start, length in zip(ids.tolist(), scores.tolist(), starts.tolist(), lengths.tolist())
+    ]
@@ -33,16 +33,26 @@ const JournalDashboard = () => {
   const prompt = "How was your day? What emotions stood out?";
 
   useEffect(() => {
-    fetch("http://localhost:8001/journal-entries")
-      .then((res) => res.json())
-      .then((data) => {
-        if (Array.isArray(data)) {
-          setEntries(data);
-        } else {
-          console.error("Expected array but got:", data);
-          setEntries([]);
+    // The calendar only needs dates and dominant emotions; follow X-Next-Cursor page by page
+    const fetchAllEntries = async () => {
+      const all = [];
+      let cursor = null;
+      do {
+        const params = new URLSearchParams({ include_words: "false", limit: "500" });
+        if (cursor) params.set("cursor", cursor);
+        const res = await fetch(`http://localhost:8001/journal-entries?${params}`);
+        const data = await res.json();
+        if (!Array.isArray(data)) {
+          throw new Error(`Expected array but got: ${JSON.stringify(data)}`);
         }
-      })
+        all.push(...data);
+        cursor = res.headers.get("X-Next-Cursor");
+      } while (cursor);
+      return all;
+    };
+
+    fetchAllEntries()
+      .then(setEntries)
       .catch((err) => {
         console.error("Error fetching entries:", err);
         setEntries([]);
@@ -21,11 +21,25 @@ const TwitterAnalyzer = () => {
     setTwitterResults(null);
 
     try {
-      const res = await fetch("http://localhost:8001/api/read_analysis");
-      const data = await res.json();
+      // Stored analyses come back a page at a time; follow next_cursor to the end
+      const analyses = [];
+      let cursor = null;
+      let failure = null;
+      do {
+        const params = new URLSearchParams({ limit: "1000" });
+        if (cursor) params.set("cursor", cursor);
+        const res = await fetch(`http://localhost:8001/api/read_analysis?${params}`);
+        const data = await res.json();
+        if (data.error || !Array.isArray(data.risk_analysis)) {
+          failure = data.error || "No stored analysis found.";
+          break;
+        }
+        analyses.push(...data.risk_analysis);
+        cursor = data.next_cursor;
+      } while (cursor);
 
-      if (data.risk_analysis && Array.isArray(data.risk_analysis)) {
-        const normalized = data.risk_analysis.map(item => ({
+      if (!failure) {
+        const normalized = analyses.map(item => ({
           date: item.date,
           text: item.text,
           probability_of_risk: Number(item.probability_of_risk),
@@ -39,7 +53,7 @@ const TwitterAnalyzer = () => {
         setWordCloudData(null);
         setSelectedEmotion("");
       } else {
-        setError(data.error || "No stored analysis found.");
+        setError(failure);
       }
     } catch (err) {
       console.error("Fetch error:", err);